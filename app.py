@@ -4,10 +4,18 @@ import plotly.express as px
 import numpy as np
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 
+from cache import create_shared_cache
+from exporter import EXPORT_FORMATS, ReportExporter
+from keyword_dedup import KeywordIndexCache, merge_keywords, normalize_keyword
+from library_history import LibraryHistory
+from monitoring import LiveFeed, MonitoringService, build_live_figures, compute_live_kpis
+from reports import REPORT_TYPES
+from scheduler import ReportScheduler
+from tags import RULE_TYPES, TagIndexCache, TagStore, rules_frame
+
 # 模拟数据生成函数
 def generate_mock_data(size=5):
     keywords = ["阿里云", "云服务器", "云数据库", "对象存储", "负载均衡"] * (size // 5 + 1)
@@ -25,6 +33,161 @@ def generate_mock_data(size=5):
     }
     return pd.DataFrame(data)
 
+# 合并近似重复词：主词按 ID 更新，其余条目按 ID 删除
+def merge_keyword_clusters(clusters):
+    keywords_data = st.session_state.keywords_data
+    merged = merge_keywords(keywords_data, clusters, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    canonical = [i for items in clusters for i in items if i in merged.index]
+    removed = keywords_data.index.difference(merged.index)
+    apply_library_change(updated=merged.loc[canonical], removed=keywords_data.loc[removed, "ID"])
+
+# 跨副本共享缓存（本地磁盘或 Redis 兼容服务），所有会话共享同一个实例
+@st.cache_resource
+def get_shared_cache():
+    return create_shared_cache()
+
+# 报告调度器在进程内只启动一次，所有会话共享
+@st.cache_resource
+def get_report_scheduler():
+    return ReportScheduler(cache=get_shared_cache()).start()
+
+# 关键词异常监控服务，后台按整点检测并写出告警
+@st.cache_resource
+def get_monitoring_service():
+    return MonitoringService(lock=get_shared_cache().backend.lock).start()
+
+# 词库历史快照，首次启动时回放最近 30 天的模拟历史
+@st.cache_resource
+def get_library_history():
+    history = LibraryHistory(lock=get_shared_cache().backend.lock)
+    history.backfill(generate_mock_data(20))
+    return history
+
+# 去重索引在进程内所有会话间共享，新增关键词时原地追加
+@st.cache_resource
+def get_keyword_index_cache():
+    return KeywordIndexCache()
+
+# 标签规则与手动标签（与词库历史一起持久化）
+@st.cache_resource
+def get_tag_store():
+    return TagStore(lock=get_shared_cache().backend.lock)
+
+# 标签索引按 (词库版本, 标签版本) 构建，进程内所有会话共享
+@st.cache_resource
+def get_tag_index_cache():
+    return TagIndexCache()
+
+# 加载当前词库版本对应的标签索引（标签规则或手动标签修改后调用）
+def load_tag_index():
+    tags_version, rules, manual = get_tag_store().load()
+    st.session_state.tag_index = get_tag_index_cache().get(
+        st.session_state.library_version, st.session_state.keywords_data, tags_version, rules, manual
+    )
+
+# 切换会话使用的词库版本，去重索引和标签索引取共享的同版本索引
+def load_library(version, library):
+    st.session_state.library_version = version
+    st.session_state.keywords_data = library
+    st.session_state.keyword_index = get_keyword_index_cache().get(version, library)
+    load_tag_index()
+
+# 把本会话的修改应用到最新的词库版本上并记录为当天版本（同一天多次记录时保留最后一次），
+# 新增的关键词在记录时分配 ID；修改后的词库会一并带入其他会话已记录的修改
+def apply_library_change(added=None, updated=None, removed=()):
+    load_library(*get_library_history().apply(added, updated, removed))
+
+# 在词库中查找关键词，返回当前行及 days 天前历史版本中的同一关键词（不存在时为 None）
+def library_keyword_rows(keyword, days=7):
+    ids = st.session_state.keyword_index.exact_items(keyword)
+    if not ids:
+        return None, None
+    current = st.session_state.keywords_data.loc[ids[0]]
+    history = get_library_history().reconstruct(datetime.now().date() - timedelta(days=days))
+    if history is None:
+        return current, None
+    matches = history[history["ID"] == current["ID"]]
+    return current, (matches.iloc[0] if len(matches) else None)
+
+# 实时看板数据源，进程内所有会话共享，增量读取监控服务写出的整点汇总
+@st.cache_resource
+def get_live_feed():
+    get_monitoring_service()
+    return LiveFeed()
+
+LIVE_INTERVALS = {"10秒": 10, "30秒": 30, "1分钟": 60, "5分钟": 300}
+
+# 实时刷新开关：开启时返回刷新间隔（秒），对应的片段按间隔局部重跑，不重跑整个页面
+def live_refresh_controls(key):
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        enabled = st.toggle("🔄 实时刷新", key=f"{key}_live")
+    with col2:
+        interval = st.select_slider(
+            "刷新间隔",
+            options=list(LIVE_INTERVALS),
+            value="30秒",
+            key=f"{key}_interval",
+            disabled=not enabled,
+            label_visibility="collapsed"
+        )
+    return LIVE_INTERVALS[interval] if enabled else None
+
+# 来源分布（静态配置，图表只构建一次）
+@st.cache_resource
+def source_distribution_figure():
+    source_data = pd.DataFrame({
+        '来源': ['百度', '360', '搜狗', '其他'],
+        '占比': [60, 20, 15, 5]
+    })
+    return px.pie(source_data, values='占比', names='来源', title='来源分布')
+
+# 数据监控实时图表（片段）：图表按数据版本在所有会话间复用
+def render_live_monitoring():
+    feed = get_live_feed()
+    figures = feed.derived("figures", build_live_figures)
+    if not figures:
+        st.info("暂无监控数据，等待监控服务写出首个整点汇总")
+        return
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(figures["流量趋势"], use_container_width=True)
+        st.plotly_chart(figures["排名分布"], use_container_width=True)
+    with col2:
+        st.plotly_chart(figures["转化趋势"], use_container_width=True)
+        st.plotly_chart(source_distribution_figure(), use_container_width=True)
+    st.caption(f"数据更新至 {feed.frame()['时间'].iloc[-1]:%Y-%m-%d %H:%M}")
+
+# 实时监控 KPI 卡片（片段）：最近 24 小时对比之前 24 小时
+def render_live_kpis():
+    kpis = get_live_feed().derived("kpis", compute_live_kpis)
+    if not kpis:
+        st.info("暂无监控数据，等待监控服务写出首个整点汇总")
+        return
+    for col, kpi in zip(st.columns(3), kpis):
+        with col:
+            st.metric(
+                label=kpi["label"],
+                value=kpi["value"],
+                delta=kpi["delta"]
+            )
+    st.caption("最近24小时，对比之前24小时")
+
+# 展示最近的异常告警
+def render_alerts(hours=24):
+    alerts = get_monitoring_service().recent_alerts(hours)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("严重告警", int((alerts["级别"] == "严重").sum()))
+    with col2:
+        st.metric("警告", int((alerts["级别"] == "警告").sum()))
+    with col3:
+        st.metric("涉及关键词", alerts["关键词"].nunique())
+    if alerts.empty:
+        st.success(f"最近{hours}小时没有异常")
+    else:
+        st.dataframe(alerts, hide_index=True, use_container_width=True)
+
 def main():
     # 设置页面配置
     st.set_page_config(
@@ -35,9 +198,12 @@ def main():
 
     # 初始化session state
     if 'keywords_data' not in st.session_state:
-        st.session_state.keywords_data = generate_mock_data(20)
+        # 从词库历史的最新版本加载
+        load_library(*get_library_history().latest())
     if 'show_add_form' not in st.session_state:
         st.session_state.show_add_form = False
+    if 'show_tag_manager' not in st.session_state:
+        st.session_state.show_tag_manager = False
 
     # 侧边栏导航
     st.sidebar.title("功能导航")
@@ -63,9 +229,17 @@ def main():
                 st.markdown("### SEO 数据")
                 # SEO核心指标
                 st.markdown("#### 核心指标")
+                library_row, previous_row = library_keyword_rows(search_keyword)
                 metric_cols = st.columns(2)
                 with metric_cols[0]:
-                    st.metric("自然排名", "5", "-2")
+                    if library_row is not None:
+                        st.metric(
+                            "自然排名",
+                            int(library_row["排名"]),
+                            f"{int(library_row['排名'] - previous_row['排名']):+d}" if previous_row is not None else None
+                        )
+                    else:
+                        st.metric("自然排名", "5", "-2")
                     st.metric("日均流量", "1,234", "+15%")
                 with metric_cols[1]:
                     st.metric("跳出率", "35.5%", "-2.1%")
@@ -97,10 +271,28 @@ def main():
                 metric_cols = st.columns(2)
                 with metric_cols[0]:
                     st.metric("广告排名", "2.3", "+1")
-                    st.metric("点击量", "856", "+12%")
+                    if library_row is not None:
+                        st.metric(
+                            "点击量",
+                            f"{int(library_row['点击量']):,}",
+                            f"{library_row['点击量'] / previous_row['点击量'] - 1:+.0%}"
+                            if previous_row is not None and previous_row["点击量"] else None
+                        )
+                    else:
+                        st.metric("点击量", "856", "+12%")
                 with metric_cols[1]:
                     st.metric("点击率", "4.5%", "+0.8%")
-                    st.metric("平均点击成本", "￥2.34", "-￥0.21")
+                    if library_row is not None:
+                        cpc_delta = library_row["CPC"] - previous_row["CPC"] if previous_row is not None else None
+                        st.metric(
+                            "平均点击成本",
+                            f"￥{library_row['CPC']:.2f}",
+                            f"{'-' if cpc_delta < 0 else '+'}￥{abs(cpc_delta):.2f}" if cpc_delta is not None else None
+                        )
+                    else:
+                        st.metric("平均点击成本", "￥2.34", "-￥0.21")
+                if library_row is not None:
+                    st.caption("自然排名、点击量、平均点击成本取自词库，与 7 天前的历史版本对比")
                 
                 # SEM趋势图
                 st.markdown("#### 投放趋势")
@@ -138,7 +330,8 @@ def main():
         with col3:
             st.button("📤 批量导入")
         with col4:
-            st.button("🏷️ 标签管理")
+            if st.button("🏷️ 标签管理"):
+                st.session_state.show_tag_manager = not st.session_state.show_tag_manager
             
         # 添加关键词表单
         if st.session_state.show_add_form:
@@ -154,19 +347,28 @@ def main():
                     priority = st.selectbox("优先级", ["高", "中", "低"])
                     clicks = st.number_input("点击量", min_value=0, value=100)
                     cpc = st.number_input("CPC", min_value=0.0, value=1.0, format="%.2f")
+                allow_similar = st.checkbox("忽略相似词提示，仍然添加")
                 
                 submitted = st.form_submit_button("提交")
                 
                 if submitted:
-                    # 检查关键词是否已存在
-                    if new_keyword in st.session_state.keywords_data["关键词"].values:
-                        st.error(f"关键词 '{new_keyword}' 已存在！")
-                    elif not new_keyword:
+                    # 规范化后检查关键词是否已存在或存在近似重复
+                    keyword_index = st.session_state.keyword_index
+                    normalized_keyword = normalize_keyword(new_keyword)
+                    matches = keyword_index.query(normalized_keyword)
+                    duplicates = keyword_index.exact_items(normalized_keyword)
+                    similar = [st.session_state.keywords_data.at[i, "关键词"] for i, _ in matches if i not in duplicates]
+                    if duplicates:
+                        existing = st.session_state.keywords_data.at[duplicates[0], "关键词"]
+                        st.error(f"关键词 '{new_keyword}' 已存在（'{existing}'）！")
+                    elif not normalized_keyword:
                         st.error("请输入关键词！")
+                    elif similar and not allow_similar:
+                        st.warning(f"存在相似关键词：{'、'.join(similar)}。如确认不是重复词，请勾选“忽略相似词提示”后再提交。")
                     else:
                         # 添加新关键词
                         new_data = pd.DataFrame([{
-                            "关键词": new_keyword,
+                            "关键词": new_keyword.strip(),
                             "搜索量": search_volume,
                             "点击量": clicks,
                             "转化率": conversion_rate,
@@ -176,8 +378,8 @@ def main():
                             "优先级": priority,
                             "更新时间": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                         }])
-                        st.session_state.keywords_data = pd.concat([st.session_state.keywords_data, new_data], ignore_index=True)
-                        st.success(f"关键词 '{new_keyword}' 添加成功！")
+                        apply_library_change(added=new_data)
+                        st.success(f"关键词 '{new_keyword.strip()}' 添加成功！")
                         st.session_state.show_add_form = False
                         st.rerun()
             
@@ -186,6 +388,7 @@ def main():
                 st.rerun()
             
         # 筛选条件
+        tag_index = st.session_state.tag_index
         col1, col2, col3 = st.columns(3)
         with col1:
             status_filter = st.multiselect("状态", ["启用", "暂停", "删除"])
@@ -193,9 +396,24 @@ def main():
             priority_filter = st.multiselect("优先级", ["高", "中", "低"])
         with col3:
             search_keyword = st.text_input("搜索关键词")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            tag_filter = st.multiselect("标签", tag_index.tags())
+        with col2:
+            tag_mode = st.radio("标签匹配方式", ["全部满足", "任一满足"], horizontal=True)
+        with col3:
+            exclude_tags = st.multiselect("排除标签", tag_index.tags())
             
-        # 应用筛选
-        df = st.session_state.keywords_data.copy()
+        # 应用筛选（标签条件先在位图上求出行掩码，再叠加其他条件）
+        if tag_filter or exclude_tags:
+            tag_mask = tag_index.query(
+                all_of=tag_filter if tag_mode == "全部满足" else (),
+                any_of=tag_filter if tag_mode == "任一满足" else (),
+                none_of=exclude_tags
+            )
+            df = st.session_state.keywords_data[tag_mask]
+        else:
+            df = st.session_state.keywords_data.copy()
         if status_filter:
             df = df[df["状态"].isin(status_filter)]
         if priority_filter:
@@ -205,8 +423,9 @@ def main():
             
         # 展示数据表格
         st.dataframe(
-            df,
+            df.assign(标签=tag_index.labels()[df.index]),
             column_config={
+                "ID": None,
                 "状态": st.column_config.SelectboxColumn(
                     "状态",
                     options=["启用", "暂停", "删除"],
@@ -221,6 +440,115 @@ def main():
             hide_index=True,
             use_container_width=True
         )
+        
+        # 标签管理：自动打标规则与手动打标
+        if st.session_state.show_tag_manager:
+            with st.container(border=True):
+                st.subheader("标签管理")
+                
+                st.markdown("#### 自动打标规则")
+                st.caption("前缀/词典规则用逗号分隔多个词，正则规则按正则表达式匹配；修改后只重新计算受影响的标签")
+                edited_rules = st.data_editor(
+                    rules_frame(tag_index),
+                    column_config={
+                        "类型": st.column_config.SelectboxColumn(
+                            "类型",
+                            options=RULE_TYPES,
+                            required=True
+                        )
+                    },
+                    num_rows="dynamic",
+                    hide_index=True,
+                    use_container_width=True,
+                    key="tag_rules_editor"
+                )
+                if st.button("应用规则"):
+                    rules = edited_rules.dropna().to_dict("records")
+                    try:
+                        affected = get_tag_store().update_rules(rules)
+                        load_tag_index()
+                        tag_index = st.session_state.tag_index
+                        st.success(f"规则已更新，重新计算的标签：{'、'.join(affected) or '无'}")
+                    except ValueError as e:
+                        st.error(str(e))
+                
+                st.markdown("#### 手动打标")
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    manual_tag = st.text_input("标签名称", placeholder="如：活动:双11")
+                with col2:
+                    manual_action = st.radio("操作", ["添加", "移除"], horizontal=True)
+                if st.button(f"应用到当前筛选结果（{len(df)} 个关键词）", disabled=not manual_tag):
+                    get_tag_store().set_manual(manual_tag, df["ID"], manual_action == "添加")
+                    load_tag_index()
+                    st.rerun()
+                
+                st.markdown("#### 标签统计")
+                st.dataframe(
+                    pd.DataFrame({
+                        "标签": tag_index.tags(),
+                        "关键词数": [tag_index.count(tag) for tag in tag_index.tags()]
+                    }),
+                    hide_index=True,
+                    use_container_width=True
+                )
+        
+        # 近似重复词聚类与合并
+        clusters = st.session_state.keyword_index.clusters()
+        with st.expander(f"🔁 近似重复词（{len(clusters)} 组）"):
+            if not clusters:
+                st.info("词库中没有近似重复的关键词")
+            else:
+                if st.button("合并全部"):
+                    merge_keyword_clusters(clusters)
+                    st.rerun()
+                for items in clusters[:50]:
+                    col1, col2 = st.columns([5, 1])
+                    with col1:
+                        st.dataframe(
+                            st.session_state.keywords_data.loc[items, ["关键词", "搜索量", "点击量", "排名", "状态", "优先级"]],
+                            hide_index=True,
+                            use_container_width=True
+                        )
+                    with col2:
+                        if st.button("合并", key=f"merge_{items[0]}"):
+                            merge_keyword_clusters([items])
+                            st.rerun()
+        
+        # 词库历史：任意两个日期之间的整体指标变化与明细差异
+        history = get_library_history()
+        history_dates = history.dates()
+        with st.expander("📜 历史变化"):
+            if not history_dates:
+                st.info("暂无词库历史")
+            else:
+                today = datetime.now().date()
+                col1, col2 = st.columns(2)
+                with col1:
+                    start_date = st.date_input(
+                        "对比日期",
+                        value=max(today - timedelta(days=7), history_dates[0]),
+                        min_value=history_dates[0],
+                        max_value=today
+                    )
+                with col2:
+                    end_date = st.date_input(
+                        "截至日期",
+                        value=today,
+                        min_value=history_dates[0],
+                        max_value=today
+                    )
+                for col, kpi in zip(st.columns(4), history.kpis(start_date, end_date)):
+                    with col:
+                        st.metric(
+                            label=kpi["label"],
+                            value=kpi["value"],
+                            delta=kpi["delta"]
+                        )
+                changes = history.diff(start_date, end_date)
+                for tab, (name, frame) in zip(st.tabs([f"{name}（{len(frame)}）" for name, frame in changes.items()]), changes.items()):
+                    with tab:
+                        st.dataframe(frame.head(1000), hide_index=True, use_container_width=True)
 
     elif page == "数据监控":
         st.header("数据监控")
@@ -238,43 +566,47 @@ def main():
                 ["整体趋势", "搜索引擎分布", "设备分布", "地域分布"]
             )
         
-        # 分别创建四个图表
-        col1, col2 = st.columns(2)
+        # 实时刷新模式：只按间隔重跑图表片段
+        live_interval = live_refresh_controls("monitoring")
+        if live_interval:
+            st.experimental_fragment(render_live_monitoring, run_every=live_interval)()
+        else:
+            # 分别创建四个图表
+            col1, col2 = st.columns(2)
         
-        with col1:
-            # 流量趋势
-            dates = pd.date_range(start='2024-01-01', end='2024-03-20', freq='D')
-            traffic_data = pd.DataFrame({
-                '日期': dates,
-                '流量': np.random.randint(1000, 5000, len(dates))
-            })
-            fig1 = px.line(traffic_data, x='日期', y='流量', title='流量趋势')
-            st.plotly_chart(fig1, use_container_width=True)
+            with col1:
+                # 流量趋势
+                dates = pd.date_range(start='2024-01-01', end='2024-03-20', freq='D')
+                traffic_data = pd.DataFrame({
+                    '日期': dates,
+                    '流量': np.random.randint(1000, 5000, len(dates))
+                })
+                fig1 = px.line(traffic_data, x='日期', y='流量', title='流量趋势')
+                st.plotly_chart(fig1, use_container_width=True)
             
-            # 排名分布
-            ranking_data = pd.DataFrame({
-                '排名区间': ['1-3名', '4-10名', '11-30名', '30名以后'],
-                '关键词数量': [30, 45, 15, 10]
-            })
-            fig2 = px.bar(ranking_data, x='排名区间', y='关键词数量', title='排名分布')
-            st.plotly_chart(fig2, use_container_width=True)
+                # 排名分布
+                ranking_data = pd.DataFrame({
+                    '排名区间': ['1-3名', '4-10名', '11-30名', '30名以后'],
+                    '关键词数量': [30, 45, 15, 10]
+                })
+                fig2 = px.bar(ranking_data, x='排名区间', y='关键词数量', title='排名分布')
+                st.plotly_chart(fig2, use_container_width=True)
             
-        with col2:
-            # 转化趋势
-            conversion_data = pd.DataFrame({
-                '日期': dates,
-                '转化量': np.random.randint(100, 500, len(dates))
-            })
-            fig3 = px.line(conversion_data, x='日期', y='转化量', title='转化趋势')
-            st.plotly_chart(fig3, use_container_width=True)
+            with col2:
+                # 转化趋势
+                conversion_data = pd.DataFrame({
+                    '日期': dates,
+                    '转化量': np.random.randint(100, 500, len(dates))
+                })
+                fig3 = px.line(conversion_data, x='日期', y='转化量', title='转化趋势')
+                st.plotly_chart(fig3, use_container_width=True)
             
-            # 来源分布
-            source_data = pd.DataFrame({
-                '来源': ['百度', '360', '搜狗', '其他'],
-                '占比': [60, 20, 15, 5]
-            })
-            fig4 = px.pie(source_data, values='占比', names='来源', title='来源分布')
-            st.plotly_chart(fig4, use_container_width=True)
+                # 来源分布
+                st.plotly_chart(source_distribution_figure(), use_container_width=True)
+        
+        # 异常告警
+        st.markdown("### 🚨 异常告警（最近24小时）")
+        render_alerts()
 
     elif page == "智能扩充":
         st.header("智能词库扩充")
@@ -387,29 +719,68 @@ def main():
         # 报告类型选择
         report_type = st.selectbox(
             "报告类型",
-            ["实时监控", "周报", "月报", "竞品分析", "自定义报告"]
+            REPORT_TYPES
         )
         
-        # 核心指标展示
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric(
-                label="平均排名",
-                value="5.2",
-                delta="-0.8"
+        # 周报/月报读取后台预计算的快照，其余类型从日聚合实时构建
+        scheduler = get_report_scheduler()
+        if report_type == "自定义报告":
+            custom_range = st.date_input(
+                "报告时间范围",
+                value=(datetime.now() - timedelta(days=13), datetime.now())
             )
+            if len(custom_range) != 2:
+                st.info("请选择报告的起止日期")
+                st.stop()
+            report = scheduler.get_range_report(*custom_range)
+        else:
+            report = scheduler.get_report(report_type)
+        figures = report["figures"]
+        meta = report["meta"]
+        if "version" in meta:
+            st.caption(f"报告周期：{meta['start']} ~ {meta['end']}（快照 v{meta['version']}，生成于 {meta['generated_at']}）")
+        else:
+            st.caption(f"报告周期：{meta['start']} ~ {meta['end']}")
+        
+        # 报告导出（HTML/图片打包下载）
+        bundle_name = f"{report_type}_{meta['start']}_{meta['end']}"
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            export_formats = st.multiselect("导出格式", EXPORT_FORMATS, default=["html"])
         with col2:
-            st.metric(
-                label="整体流量",
-                value="12,345",
-                delta="15%"
-            )
-        with col3:
-            st.metric(
-                label="转化率",
-                value="3.4%",
-                delta="0.5%"
-            )
+            if st.button("📦 导出报告", disabled=not export_formats):
+                with st.spinner("正在渲染报告图表..."):
+                    exporter = ReportExporter(formats=export_formats)
+                    st.session_state.report_bundle = (
+                        (bundle_name, tuple(export_formats)),
+                        exporter.export({bundle_name: report})[bundle_name]
+                    )
+            if st.session_state.get("report_bundle", (None,))[0] == (bundle_name, tuple(export_formats)):
+                with open(st.session_state.report_bundle[1], "rb") as f:
+                    st.download_button(
+                        label="📥 下载导出包",
+                        data=f.read(),
+                        file_name=f"{bundle_name}.zip",
+                        mime="application/zip"
+                    )
+        
+        # 核心指标展示；实时监控的指标卡片由监控汇总驱动，可按间隔局部刷新
+        if report_type == "实时监控":
+            live_interval = live_refresh_controls("report")
+            st.experimental_fragment(render_live_kpis, run_every=live_interval)()
+        else:
+            for col, kpi in zip(st.columns(3), meta["kpis"]):
+                with col:
+                    st.metric(
+                        label=kpi["label"],
+                        value=kpi["value"],
+                        delta=kpi["delta"]
+                    )
+        
+        # 实时监控展示最近的异常告警
+        if report_type == "实时监控":
+            st.markdown("#### 🚨 异常告警（最近24小时）")
+            render_alerts()
             
         # 添加详细报告内容
         tabs = st.tabs(["流量分析", "转化分析", "竞品分析", "投放建议"])
@@ -419,212 +790,52 @@ def main():
             
             # 1. 流量来源分布（改用堆积柱状图）
             st.markdown("#### 流量来源分布")
-            # 准备按时间的流量来源数据
-            dates = pd.date_range(start='2024-03-01', end='2024-03-07', freq='D')
-            source_data = pd.DataFrame({
-                '日期': dates.repeat(6),
-                '来源': ['自然搜索', '付费搜索', '直接访问', '社交媒体', '邮件营销', '其他'] * len(dates),
-                '流量': [
-                    *np.random.randint(4000, 6000, len(dates)),  # 自然搜索
-                    *np.random.randint(2000, 4000, len(dates)),  # 付费搜索
-                    *np.random.randint(1000, 2000, len(dates)),  # 直接访问
-                    *np.random.randint(500, 1000, len(dates)),   # 社交媒体
-                    *np.random.randint(300, 700, len(dates)),    # 邮件营销
-                    *np.random.randint(100, 300, len(dates))     # 其他
-                ]
-            })
-            
-            fig = px.bar(source_data, 
-                        x='日期', 
-                        y='流量',
-                        color='来源',
-                        title='流量来源分布趋势',
-                        color_discrete_sequence=px.colors.qualitative.Set3)
-            
-            fig.update_layout(
-                barmode='relative',
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                yaxis_title='流量占比',
-                xaxis_title='日期',
-                legend_title='流量来源',
-                title_x=0.5
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(figures["流量来源分布"], use_container_width=True)
             
             # 2. 流量落地页分布（改进可视化）
             st.markdown("#### 流量落地页分布")
-            landing_data = pd.DataFrame({
-                "页面": ["首页", "产品详情", "解决方案", "定价页", "文档中心"],
-                "访问量": [8000, 5000, 3000, 2000, 1500],
-                "跳出率": [0.25, 0.35, 0.4, 0.3, 0.45],
-                "平均停留时间": ["2:30", "3:45", "1:50", "2:15", "4:20"]
-            })
             
             # 创建两列布局
             col1, col2 = st.columns(2)
             
             with col1:
                 # 访问量和跳出率对比图
-                fig = make_subplots(specs=[[{"secondary_y": True}]])
-                
-                fig.add_trace(
-                    go.Bar(
-                        name="访问量",
-                        x=landing_data["页面"],
-                        y=landing_data["访问量"],
-                        marker_color='rgb(158,202,225)'
-                    ),
-                    secondary_y=False
-                )
-                
-                fig.add_trace(
-                    go.Scatter(
-                        name="跳出率",
-                        x=landing_data["页面"],
-                        y=landing_data["跳出率"],
-                        mode='lines+markers',
-                        marker_color='rgb(94,94,94)',
-                        line=dict(color='rgb(94,94,94)')
-                    ),
-                    secondary_y=True
-                )
-                
-                fig.update_layout(
-                    title="页面访问量与跳出率",
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    title_x=0.5
-                )
-                
-                fig.update_yaxes(title_text="访问量", secondary_y=False)
-                fig.update_yaxes(title_text="跳出率", secondary_y=True)
-                
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(figures["页面访问量与跳出率"], use_container_width=True)
             
             with col2:
                 # 平均停留时间图
-                time_in_seconds = [int(t.split(':')[0]) * 60 + int(t.split(':')[1]) for t in landing_data["平均停留时间"]]
-                
-                fig = go.Figure(data=[
-                    go.Bar(
-                        name="平均停留时间",
-                        x=landing_data["页面"],
-                        y=time_in_seconds,
-                        text=[f"{t}" for t in landing_data["平均停留时间"]],
-                        textposition='auto',
-                        marker_color='rgb(142,202,230)'
-                    )
-                ])
-                
-                fig.update_layout(
-                    title="页面平均停留时间",
-                    yaxis_title="时间（秒）",
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    title_x=0.5
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(figures["页面平均停留时间"], use_container_width=True)
             
             # 3. 流量转化路径（优化桑基图）
             st.markdown("#### 流量转化路径")
-            fig = go.Figure(data=[go.Sankey(
-                node = dict(
-                    pad = 15,
-                    thickness = 20,
-                    line = dict(color = "rgba(0,0,0,0)", width = 0.5),
-                    label = ["访问", "搜索", "浏览产品", "加入购物车", "注册", "购买"],
-                    color = ["#FFB6C1", "#87CEEB", "#98FB98", "#DDA0DD", "#F0E68C", "#E6E6FA"]  # 柔和的配色方案
-                ),
-                link = dict(
-                    source = [0, 0, 1, 1, 2, 2, 3, 4],
-                    target = [1, 2, 3, 4, 4, 5, 5, 5],
-                    value = [8000, 4000, 3000, 2000, 1500, 1000, 800, 500],
-                    color = ["rgba(255,182,193,0.3)", "rgba(135,206,235,0.3)", 
-                            "rgba(152,251,152,0.3)", "rgba(221,160,221,0.3)", 
-                            "rgba(240,230,140,0.3)", "rgba(230,230,250,0.3)",
-                            "rgba(255,182,193,0.3)", "rgba(135,206,235,0.3)"]  # 半透明的连接颜色
-                )
-            )])
-            
-            fig.update_layout(
-                title_text="用户转化路径分析",
-                font_size=12,
-                height=400,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                title_x=0.5
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(figures["用户转化路径"], use_container_width=True)
 
         with tabs[1]:
             st.markdown("### 转化分析")
             
             # 1. 转化漏斗
             st.markdown("#### 整体转化漏斗")
-            funnel_data = pd.DataFrame({
-                "阶段": ["访问", "点击", "注册", "购买"],
-                "数量": [10000, 5000, 1000, 200]
-            })
-            fig = go.Figure(go.Funnel(y=funnel_data["阶段"], x=funnel_data["数量"]))
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(figures["整体转化漏斗"], use_container_width=True)
             
             # 2. 产品转化分布
             st.markdown("#### 产品转化分布")
-            product_data = pd.DataFrame({
-                "产品": ["ECS云服务器", "OSS对象存储", "RDS云数据库", "CDN", "负载均衡", 
-                        "云监控", "容器服务", "弹性公网IP", "NAT网关", "SSL证书"],
-                "销量": np.random.randint(100, 1000, 10),
-                "收入": np.random.randint(10000, 100000, 10),
-                "同比增长": np.random.uniform(-0.3, 0.5, 10)
-            })
             
             # 产品销量对比
-            fig = px.bar(product_data, x="产品", y="销量", 
-                        text=product_data["销量"].apply(str),
-                        title="各产品销量分布")
-            fig.update_layout(xaxis_tickangle=45)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(figures["各产品销量分布"], use_container_width=True)
             
             # 产品收入热力图
-            product_channel = pd.DataFrame(
-                np.random.randint(1000, 10000, size=(10, 4)),
-                columns=["自然搜索", "付费搜索", "直接访问", "其他"],
-                index=product_data["产品"]
-            )
-            fig = px.imshow(product_channel, 
-                          title="产品-渠道收入分布",
-                          aspect="auto")
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(figures["产品-渠道收入分布"], use_container_width=True)
             
         with tabs[2]:
             st.markdown("### 竞品分析")
             
             # 1. 关键词覆盖对比
             st.markdown("#### 关键词覆盖对比")
-            competitors = ["阿里云", "腾讯云", "华为云", "火山云"]
-            coverage_data = pd.DataFrame({
-                "品牌": competitors * 3,
-                "关键词类型": ["产品词"] * 4 + ["品牌词"] * 4 + ["解决方案词"] * 4,
-                "覆盖率": np.random.uniform(0.3, 0.9, 12)
-            })
-            fig = px.bar(coverage_data, x="品牌", y="覆盖率", color="关键词类型", 
-                        barmode="group", title="关键词覆盖率对比")
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(figures["关键词覆盖率对比"], use_container_width=True)
             
             # 2. 多维度竞争力分析
             st.markdown("#### 多维度竞争力分析")
-            metrics = ["搜索排名", "广告投放", "品牌知名度", "产品完整度", "价格优势"]
-            radar_data = pd.DataFrame({
-                "指标": metrics * len(competitors),
-                "品牌": [comp for comp in competitors for _ in metrics],
-                "得分": np.random.uniform(60, 100, len(metrics) * len(competitors))
-            })
-            fig = px.line_polar(radar_data, r="得分", theta="指标", color="品牌", 
-                              line_close=True, title="竞争力雷达图")
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(figures["竞争力雷达图"], use_container_width=True)
             
         with tabs[3]:
             st.markdown("### 投放建议")
@@ -659,38 +870,14 @@ def main():
                 col1, col2 = st.columns(2)
                 with col1:
                     # ROI趋势
-                    dates = pd.date_range(start='2024-01-01', end='2024-03-31', freq='D')
-                    roi_data = pd.DataFrame({
-                        '日期': dates,
-                        'ROI': np.random.uniform(2.5, 3.5, len(dates))
-                    })
-                    fig = px.line(roi_data, x='日期', y='ROI', title='ROI趋势分析')
-                    st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(figures["ROI趋势分析"], use_container_width=True)
                 
                 with col2:
                     # 长尾词vs核心词对比
-                    keyword_type_data = pd.DataFrame({
-                        '指标': ['展现量', '点击率', '转化率', '获客成本'],
-                        '长尾词': [15000, 0.035, 0.028, 35],
-                        '核心词': [50000, 0.025, 0.018, 55]
-                    })
-                    fig = go.Figure(data=[
-                        go.Bar(name='长尾词', x=keyword_type_data['指标'], y=keyword_type_data['长尾词']),
-                        go.Bar(name='核心词', x=keyword_type_data['指标'], y=keyword_type_data['核心词'])
-                    ])
-                    fig.update_layout(title='长尾词vs核心词效果对比', barmode='group')
-                    st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(figures["长尾词vs核心词效果对比"], use_container_width=True)
                 
                 # 时段转化率热力图
-                hours = list(range(24))
-                days = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
-                conversion_matrix = np.random.uniform(0.01, 0.05, (len(days), len(hours)))
-                fig = px.imshow(conversion_matrix,
-                              labels=dict(x="小时", y="星期", color="转化率"),
-                              x=hours,
-                              y=days,
-                              title="时段转化率分布")
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(figures["时段转化率分布"], use_container_width=True)
 
             elif scenario == "预算分配建议":
                 st.info("""
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import CACHE_MAX_BYTES, CACHE_URL, DATA_DIR
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# 缓存格式版本，序列化结构变化时递增，使旧缓存全部失效
+CACHE_SCHEMA = 1
+
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+
+# Redis 锁的失效时间（秒）：持有者每隔三分之一的失效时间续期一次，持有者崩溃后最多这么久即可被其他进程接管
+LOCK_STALE_SECONDS = 30
+
+# get_or_compute 等待其他进程计算的最长时间（秒），超时后本进程自行计算
+COMPUTE_WAIT_SECONDS = 60
+
+# 命名空间失效计数器在进程内的缓存时间（秒）：其他副本调用 invalidate 后最多这么久生效
+NAMESPACE_VERSION_TTL = 5
+
+
+class LockTimeout(TimeoutError):
+    pass
+
+
+# 持有锁期间在后台线程中定期续期
+@contextmanager
+def _heartbeat(renew, interval):
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            renew()
+
+    thread = threading.Thread(target=run, name="lock-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+# 非阻塞地对文件加独占锁，已被其他文件描述符锁住时返回 False
+def _try_lock_file(fd):
+    try:
+        if os.name == "nt":
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+# 磁盘后端：同一节点上的所有应用副本共享一个目录，写入为原子替换，
+# 按最近访问时间（mtime）淘汰，总大小不超过 max_bytes
+class DiskBackend:
+    def __init__(self, root=None, max_bytes=CACHE_MAX_BYTES):
+        self.root = root or CACHE_DIR
+        self.max_bytes = max_bytes
+        self._written = 0
+        os.makedirs(os.path.join(self.root, "_meta"), exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    # 磁盘后端不主动清理过期条目：读到时删除，从未再读的条目按最近访问淘汰
+    def set(self, key, value, ttl=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        self._written += len(value)
+        if self._written > self.max_bytes // 20:
+            self.evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    # 超出上限时删除最久未访问的条目，直到降到上限的 90%
+    def evict(self):
+        self._written = 0
+        entries, total = [], 0
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name == "_meta":
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith((".tmp", ".lock")):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes * 0.9:
+                break
+
+    def get_counter(self, name):
+        try:
+            with open(os.path.join(self.root, "_meta", f"{name}.counter")) as f:
+                return int(f.read())
+        except FileNotFoundError:
+            return 0
+
+    def incr(self, name):
+        with self.lock(f"counter-{name}"):
+            value = self.get_counter(name) + 1
+            path = os.path.join(self.root, "_meta", f"{name}.counter")
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(value))
+            os.replace(tmp_path, path)
+        return value
+
+    # 跨进程互斥锁：对锁文件加操作系统文件锁（fcntl.flock / Windows 上为 msvcrt.locking），
+    # 持有进程退出或崩溃时由系统释放，不存在过期接管，也不需要续期。timeout 为等待上限，None 表示一直等待。
+    # 释放时在持有锁的状态下删除锁文件；加锁成功后确认锁住的仍是当前路径上的文件，
+    # 否则说明加锁前文件已被上一个持有者删除，重新打开再加锁
+    @contextmanager
+    def lock(self, name, timeout=None, stale_after=None):
+        path = os.path.join(self.root, "_meta", f"{name}.lock")
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            fd = os.open(path, os.O_CREAT | os.O_RDWR)
+            if _try_lock_file(fd):
+                try:
+                    if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                        break
+                except FileNotFoundError:
+                    pass
+            os.close(fd)
+            if deadline is not None and time.time() > deadline:
+                raise LockTimeout(f"等待缓存锁超时: {name}")
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                # Windows 上无法删除仍被打开的文件，锁文件留待下次复用
+                pass
+            os.close(fd)
+
+
+# Redis 后端：兼容 Redis 协议的服务均可（如本地 Redis、KeyDB、fakeredis），
+# 容量上限与淘汰由服务端 maxmemory / allkeys-lru 配置负责
+class RedisBackend:
+    def __init__(self, client, prefix="seo-cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=int(ttl) + 1 if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def evict(self):
+        pass
+
+    def get_counter(self, name):
+        return int(self.client.get(f"{self.prefix}counter:{name}") or 0)
+
+    def incr(self, name):
+        return self.client.incr(f"{self.prefix}counter:{name}")
+
+    # 锁的过期时间为 stale_after，持有期间由心跳线程定期续期。
+    # redis-py 默认把锁的 token 保存在线程局部变量中，心跳线程读不到 token 会续期失败，因此关闭 thread_local
+    @contextmanager
+    def lock(self, name, timeout=None, stale_after=None):
+        stale_after = stale_after or LOCK_STALE_SECONDS
+        lock = self.client.lock(f"{self.prefix}lock:{name}", timeout=stale_after, thread_local=False)
+        if not lock.acquire(blocking_timeout=timeout):
+            raise LockTimeout(f"等待缓存锁超时: {name}")
+        try:
+            with _heartbeat(lock.reacquire, stale_after / 3):
+                yield
+        finally:
+            lock.release()
+
+
+# 共享缓存：键由命名空间、命名空间版本和参数内容哈希得到。
+# 命名空间版本由两部分组成：调用方登记的代码版本（代码变化后旧条目自动失效），
+# 以及所有副本共享的失效计数器（invalidate 时递增，用于数据修正等显式失效）；
+# 失效后旧条目不再被读取，由容量淘汰或过期清理
+class SharedCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.code_versions = {}
+        self._counters = {}
+
+    def set_code_version(self, namespace, version):
+        self.code_versions[namespace] = version
+
+    def namespace_version(self, namespace):
+        cached = self._counters.get(namespace)
+        if cached is None or cached[0] < time.time():
+            cached = (time.time() + NAMESPACE_VERSION_TTL, self.backend.get_counter(f"namespace-{namespace}"))
+            self._counters[namespace] = cached
+        return f"{self.code_versions.get(namespace, '')}.{cached[1]}"
+
+    # 使命名空间下的全部条目失效
+    def invalidate(self, namespace):
+        self.backend.incr(f"namespace-{namespace}")
+        self._counters.pop(namespace, None)
+
+    def make_key(self, namespace, parts):
+        content = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        raw = f"{CACHE_SCHEMA}|{namespace}|{self.namespace_version(namespace)}|{content}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # 读取条目，已过期的条目顺带删除
+    def _load(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            return None
+        expires_at, obj = pickle.loads(value)
+        if expires_at is not None and expires_at < time.time():
+            self.backend.delete(key)
+            return None
+        return obj,
+
+    def get(self, namespace, parts, default=None):
+        hit = self._load(self.make_key(namespace, parts))
+        return hit[0] if hit else default
+
+    def _store(self, key, value, ttl):
+        expires_at = time.time() + ttl if ttl else None
+        self.backend.set(key, pickle.dumps((expires_at, value), protocol=pickle.HIGHEST_PROTOCOL), ttl=ttl)
+
+    def set(self, namespace, parts, value, ttl=None):
+        self._store(self.make_key(namespace, parts), value, ttl)
+
+    # 读取或计算：同一个键在所有副本中只有一个进程计算，其余进程等待后直接读取结果；
+    # 等待超过 COMPUTE_WAIT_SECONDS 时不再等待，本进程自行计算，不把超时抛给页面
+    def get_or_compute(self, namespace, parts, compute, ttl=None):
+        key = self.make_key(namespace, parts)
+        hit = self._load(key)
+        if hit:
+            return hit[0]
+        try:
+            with self.backend.lock(key, timeout=COMPUTE_WAIT_SECONDS):
+                hit = self._load(key)
+                if hit:
+                    return hit[0]
+                value = compute()
+                self._store(key, value, ttl)
+                return value
+        except LockTimeout:
+            value = compute()
+            self._store(key, value, ttl)
+            return value
+
+
+# 按配置创建共享缓存：SEO_CACHE_URL 为 redis:// 地址时使用 Redis 后端，否则使用本地磁盘
+def create_shared_cache(url=CACHE_URL):
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return SharedCache(RedisBackend.from_url(url))
+    return SharedCache(DiskBackend())
@@ -0,0 +1,11 @@
+import os
+
+# 本地数据目录（日聚合、报告快照等），可通过环境变量覆盖
+DATA_DIR = os.environ.get(
+    "SEO_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+)
+
+# 共享缓存：SEO_CACHE_URL 为 redis:// 地址时使用 Redis 兼容服务，否则使用本地磁盘
+CACHE_URL = os.environ.get("SEO_CACHE_URL", "")
+CACHE_MAX_BYTES = int(os.environ.get("SEO_CACHE_MAX_BYTES", 1024 ** 3))
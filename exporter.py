@@ -0,0 +1,200 @@
+import argparse
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+from config import DATA_DIR
+from reports import REPORT_TYPES
+
+# 导出目录：rendered/ 为按内容寻址的渲染缓存，bundles/ 为按报告打包的压缩包
+EXPORTS_DIR = os.path.join(DATA_DIR, "exports")
+RENDERED_DIR = os.path.join(EXPORTS_DIR, "rendered")
+BUNDLES_DIR = os.path.join(EXPORTS_DIR, "bundles")
+
+EXPORT_FORMATS = ["html", "png"]
+
+
+# 图表内容哈希：相同图表（无论属于哪份报告、发给哪个收件人）只渲染一次
+def figure_key(fig_json, fmt):
+    return hashlib.sha256(f"{fmt}:{fig_json}".encode("utf-8")).hexdigest()
+
+
+def _rendered_path(key, fmt):
+    return os.path.join(RENDERED_DIR, f"{key}.{fmt}")
+
+
+# 在工作进程中渲染单个图表，HTML 引用同目录下的 plotly.min.js 以免每个文件都内嵌一份
+def render_figure(fig_json, fmt, path):
+    fig = pio.from_json(fig_json)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    if fmt == "html":
+        fig.write_html(tmp_path, include_plotlyjs="directory", full_html=True)
+    else:
+        fig.write_image(tmp_path, format=fmt, width=1200, height=600, scale=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _index_html(name, report, chart_files):
+    meta = report["meta"]
+    kpis = "".join(
+        f"<tr><td>{html.escape(k['label'])}</td><td>{html.escape(k['value'])}</td>"
+        f"<td>{html.escape(k['delta'])}</td></tr>"
+        for k in meta["kpis"]
+    )
+    charts = []
+    for title, files in chart_files.items():
+        charts.append(f"<h2>{html.escape(title)}</h2>")
+        if "html" in files:
+            charts.append(f'<iframe src="{files["html"]}" width="100%" height="520" frameborder="0"></iframe>')
+        elif "png" in files:
+            charts.append(f'<img src="{files["png"]}" width="100%">')
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head><meta charset="utf-8"><title>{html.escape(name)}</title></head>
+<body>
+<h1>{html.escape(name)}</h1>
+<p>报告周期：{meta['start']} ~ {meta['end']}，生成于 {meta['generated_at']}</p>
+<table border="1" cellpadding="6"><tr><th>指标</th><th>数值</th><th>环比</th></tr>{kpis}</table>
+{''.join(charts)}
+</body>
+</html>
+"""
+
+
+# 报告导出：先对所有报告的图表按内容去重，在进程池中并行渲染，再按报告分别打包
+class ReportExporter:
+    def __init__(self, formats=None, max_workers=None):
+        self.formats = formats or ["html"]
+        for fmt in self.formats:
+            if fmt not in EXPORT_FORMATS:
+                raise ValueError(f"不支持的导出格式: '{fmt}'")
+        self.max_workers = max_workers or os.cpu_count()
+
+    # 序列化报告中的图表并计算各格式的内容哈希，每个图表只序列化一次，渲染和打包共用：
+    # 返回 [(标题, 图表 JSON, {格式: 图表哈希})]
+    def serialize(self, report):
+        charts = []
+        for title, fig in report["figures"].items():
+            fig_json = pio.to_json(fig)
+            charts.append((title, fig_json, {fmt: figure_key(fig_json, fmt) for fmt in self.formats}))
+        return charts
+
+    # 渲染缺失的图表，charts 为 {报告名: serialize 的结果}，返回 {(图表哈希, 格式): 文件路径}
+    def render_all(self, charts):
+        os.makedirs(RENDERED_DIR, exist_ok=True)
+        if "html" in self.formats:
+            plotlyjs_path = os.path.join(RENDERED_DIR, "plotly.min.js")
+            if not os.path.exists(plotlyjs_path):
+                with open(plotlyjs_path, "w", encoding="utf-8") as f:
+                    f.write(get_plotlyjs())
+
+        rendered, pending = {}, {}
+        for report_charts in charts.values():
+            for _, fig_json, keys in report_charts:
+                for fmt, key in keys.items():
+                    path = _rendered_path(key, fmt)
+                    if os.path.exists(path):
+                        rendered[key, fmt] = path
+                    else:
+                        pending[key, fmt] = fig_json
+
+        if pending:
+            # 所有图表同时提交，总耗时约等于最慢的单个图表
+            with ProcessPoolExecutor(
+                max_workers=min(self.max_workers, len(pending)),
+                mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                futures = {
+                    (key, fmt): pool.submit(render_figure, fig_json, fmt, _rendered_path(key, fmt))
+                    for (key, fmt), fig_json in pending.items()
+                }
+                for job, future in futures.items():
+                    rendered[job] = future.result()
+        return rendered
+
+    # 将一份报告打包为 zip：index.html + charts/。
+    # 文件名包含导出格式和内容哈希，不同格式或不同内容的导出互不覆盖，相同内容直接复用
+    def package(self, name, report, charts, rendered):
+        files = [
+            (title, {fmt: (f"charts/{i:02d}.{fmt}", key) for fmt, key in keys.items()})
+            for i, (title, _, keys) in enumerate(charts, start=1)
+        ]
+        digest = hashlib.sha256(json.dumps(
+            [name, report["meta"], files], ensure_ascii=False, sort_keys=True, default=str
+        ).encode("utf-8")).hexdigest()[:12]
+
+        os.makedirs(BUNDLES_DIR, exist_ok=True)
+        bundle_path = os.path.join(BUNDLES_DIR, f"{name}_{'-'.join(self.formats)}_{digest}.zip")
+        if os.path.exists(bundle_path):
+            return bundle_path
+        tmp_path = f"{bundle_path}.{uuid.uuid4().hex}.tmp"
+        chart_files = {}
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as bundle:
+            if "html" in self.formats:
+                bundle.write(os.path.join(RENDERED_DIR, "plotly.min.js"), "charts/plotly.min.js")
+            for title, chart in files:
+                chart_files[title] = {}
+                for fmt, (arcname, key) in chart.items():
+                    bundle.write(rendered[key, fmt], arcname)
+                    chart_files[title][fmt] = arcname
+            bundle.writestr("index.html", _index_html(name, report, chart_files))
+            bundle.writestr("meta.json", json.dumps(report["meta"], ensure_ascii=False, indent=2))
+        os.replace(tmp_path, bundle_path)
+        return bundle_path
+
+    # 导出多份报告，返回 {报告名: 压缩包路径}
+    def export(self, reports):
+        charts = {name: self.serialize(report) for name, report in reports.items()}
+        rendered = self.render_all(charts)
+        return {name: self.package(name, report, charts[name], rendered) for name, report in reports.items()}
+
+    # 按收件人分发：每份报告只导出一次，多个收件人共享同一个压缩包
+    def export_for_recipients(self, subscriptions, get_report):
+        names = {name for report_names in subscriptions.values() for name in report_names}
+        bundles = self.export({name: get_report(name) for name in sorted(names)})
+        return {
+            recipient: [bundles[name] for name in report_names]
+            for recipient, report_names in subscriptions.items()
+        }
+
+
+if __name__ == '__main__':
+    # 离线批量导出：python exporter.py 周报 月报 --format html png
+    # 按收件人分发：python exporter.py --subscriptions subscriptions.json，
+    # 订阅文件为 {"收件人": ["周报", "月报"]}，每份报告只导出一次，订阅同一报告的收件人共享压缩包
+    from scheduler import ReportScheduler
+
+    parser = argparse.ArgumentParser(description="导出数据报告")
+    parser.add_argument("reports", nargs="*", help=f"报告类型：{'、'.join(REPORT_TYPES[:-1])}")
+    parser.add_argument("--subscriptions", default=None, help="收件人订阅文件（JSON）")
+    parser.add_argument("--format", nargs="+", default=["html"], choices=EXPORT_FORMATS)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    if not args.reports and not args.subscriptions:
+        parser.error("需要指定报告类型或 --subscriptions")
+
+    subscriptions = {}
+    if args.subscriptions:
+        with open(args.subscriptions, encoding="utf-8") as f:
+            subscriptions = json.load(f)
+    unknown = ({name for names in subscriptions.values() for name in names} | set(args.reports)) - set(REPORT_TYPES[:-1])
+    if unknown:
+        parser.error(f"不支持的报告类型: {'、'.join(sorted(unknown))}")
+
+    scheduler = ReportScheduler()
+    exporter = ReportExporter(formats=args.format, max_workers=args.workers)
+    if subscriptions:
+        for recipient, paths in exporter.export_for_recipients(subscriptions, scheduler.get_report).items():
+            print(f"{recipient}: {', '.join(paths)}")
+    else:
+        for name, path in exporter.export({name: scheduler.get_report(name) for name in args.reports}).items():
+            print(f"{name}: {path}")
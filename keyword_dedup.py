@@ -0,0 +1,281 @@
+import re
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+# MinHash 参数：128 个哈希函数，分为 16 个 band、每个 band 8 行，
+# 碰撞阈值约 (1/16)^(1/8) ≈ 0.71，略低于校验阈值 0.8：相似度 0.8 的词对约 95% 能成为候选，
+# 0.5 以下的词对几乎不会落入同一个桶
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 2
+SIMILARITY_THRESHOLD = 0.8
+# 单个桶最多保存的条目数：模板化的关键词（共同前缀/后缀）会大量落入同一个桶，
+# 这样的 band 取值没有区分度，桶满后不再追加，查询时也直接跳过，
+# 候选只来自其余 band，插入和查询的代价不随词库增长
+MAX_BUCKET_SIZE = 64
+BATCH_SIZE = 10000
+
+# 置换参数在 [1, p) 中取值：若 a 只取 32 位，crc32 值较小的 shingle 在所有置换下都是最小值，
+# 各 band 高度相关，高相似度的词对也可能一个桶都不碰撞（uint64 乘法溢出回绕，与 datasketch 相同）
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240301)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, NUM_PERM, dtype=np.uint64)
+
+_CJK = r"㐀-鿿豈-﫿"
+_PUNCTUATION = re.compile(r"[\s\-_/\\|·•,，。、:：;；!！?？'\"“”‘’()（）\[\]【】<>《》]+")
+# + 和 # 紧跟在字母数字后（c++、c#）、. 后接字母数字（.net、node.js、2.0）时属于词的一部分，其余位置视为标点
+_LOOSE_SYMBOLS = re.compile(r"(?<![a-z0-9+#])[+#]+|\.(?![a-z0-9])")
+_CJK_SPACE = re.compile(rf"(?<=[{_CJK}]) | (?=[{_CJK}])")
+
+
+# 关键词规范化：全角转半角（NFKC）、英文小写、标点统一为空格、去掉中文两侧的空格；
+# 规范化结果只用作去重索引的键，词库中保存用户输入的原词
+def normalize_keyword(keyword):
+    text = unicodedata.normalize("NFKC", str(keyword)).lower()
+    text = _LOOSE_SYMBOLS.sub(" ", text)
+    text = _PUNCTUATION.sub(" ", text).strip()
+    return _CJK_SPACE.sub("", text)
+
+
+# 字符 n-gram 的 32 位哈希集合（忽略空格），关键词很短时退化为整个词
+def shingle_hashes(normalized):
+    text = normalized.replace(" ", "")
+    if len(text) <= SHINGLE_SIZE:
+        return frozenset([zlib.crc32(text.encode("utf-8"))])
+    return frozenset(
+        zlib.crc32(text[i:i + SHINGLE_SIZE].encode("utf-8"))
+        for i in range(len(text) - SHINGLE_SIZE + 1)
+    )
+
+
+def _as_array(hashes):
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+# 单个关键词的 MinHash 签名
+def minhash(hashes):
+    return ((np.outer(_as_array(hashes), _PERM_A) + _PERM_B) % _MERSENNE_PRIME).min(axis=0)
+
+
+# 批量计算签名：所有关键词的 shingle 拼接为一维数组，用 reduceat 按词求最小值，整体线性复杂度
+def minhash_batch(hash_lists):
+    if len(hash_lists) == 0:
+        return np.empty((0, NUM_PERM), dtype=np.uint64)
+    lengths = np.array([len(h) for h in hash_lists])
+    flat = np.fromiter((h for hashes in hash_lists for h in hashes), dtype=np.uint64, count=lengths.sum())
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    permuted = (flat[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME
+    return np.minimum.reduceat(permuted, offsets, axis=0)
+
+
+def _band_keys(signature):
+    return [signature[i * ROWS:(i + 1) * ROWS].tobytes() for i in range(BANDS)]
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+# 关键词近似重复索引：规范化后完全相同的词直接命中（不再进入 LSH 桶），
+# 其余通过 LSH 分桶找候选，再用真实 Jaccard 相似度校验，并用并查集维护聚类；
+# 每个聚类只需校验一个成员，桶内重复的聚类直接跳过。
+# 条目为词库行号，只在末尾追加；limit 参数只返回行号小于 limit 的条目，
+# 这样追加之后，仍在使用旧版本词库（行数较少）的会话看到的结果不受影响。
+# 索引在会话间共享，读写都在索引的锁内进行
+class KeywordIndex:
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.normalized = {}
+        self.shingles = {}
+        self.exact = {}
+        self.buckets = [{} for _ in range(BANDS)]
+        self.parent = {}
+        self.lock = threading.RLock()
+        self._clusters = {}
+
+    def __len__(self):
+        return len(self.parent)
+
+    def _find(self, item):
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def _union(self, a, b):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    # 查询与关键词相似的已有条目，返回 [(id, 相似度)]，按相似度降序；
+    # 规范化后相同的条目全部返回，近似条目每个聚类返回一个代表
+    def query(self, keyword, limit=None, _prepared=None):
+        with self.lock:
+            limit = len(self.parent) if limit is None else limit
+            normalized, hashes, signature = _prepared or self._prepare(keyword)
+            matches = {item: 1.0 for item in self.exact.get(normalized, []) if item < limit}
+            if signature is None:
+                if matches:
+                    return list(matches.items())
+                # 相同的词只存在于 limit 之后的行中，按近似匹配查找
+                signature = minhash(hashes)
+            # 并查集的根是聚类中最小的行号，旧版本中存在的聚类其根也在 limit 之内
+            checked = {self._find(item) for item in matches}
+            seen = set()
+            for bucket, key in zip(self.buckets, _band_keys(signature)):
+                items = bucket.get(key, [])
+                if len(items) >= MAX_BUCKET_SIZE:
+                    continue
+                for item in items:
+                    if item >= limit or item in seen:
+                        continue
+                    seen.add(item)
+                    root = self._find(item)
+                    if root in checked:
+                        continue
+                    similarity = _jaccard(hashes, self.shingles[item])
+                    if similarity >= self.threshold:
+                        checked.add(root)
+                        matches[item] = similarity
+            return sorted(matches.items(), key=lambda x: -x[1])
+
+    # 规范化后与关键词完全相同的条目
+    def exact_items(self, keyword, limit=None):
+        with self.lock:
+            limit = len(self.parent) if limit is None else limit
+            return [item for item in self.exact.get(normalize_keyword(keyword), []) if item < limit]
+
+    # 规范化后已存在的词无需计算签名
+    def _prepare(self, keyword):
+        normalized = normalize_keyword(keyword)
+        hashes = shingle_hashes(normalized)
+        return normalized, hashes, None if normalized in self.exact else minhash(hashes)
+
+    def _insert(self, item, normalized, hashes, signature, matches):
+        self.normalized[item] = normalized
+        self.parent[item] = item
+        if normalized not in self.exact:
+            self.shingles[item] = hashes
+            for bucket, key in zip(self.buckets, _band_keys(signature)):
+                items = bucket.setdefault(key, [])
+                if len(items) < MAX_BUCKET_SIZE:
+                    items.append(item)
+        self.exact.setdefault(normalized, []).append(item)
+        for other, _ in matches:
+            self._union(item, other)
+
+    # 增量插入单个关键词，返回与之相似的已有条目
+    def add(self, item, keyword):
+        with self.lock:
+            prepared = self._prepare(keyword)
+            matches = self.query(keyword, _prepared=prepared)
+            self._insert(item, *prepared, matches)
+            self._clusters = {}
+            return matches
+
+    # 批量插入（初始化整个词库或批量导入），签名向量化计算
+    def add_many(self, items, keywords):
+        normalized = [normalize_keyword(k) for k in keywords]
+        hash_lists = [shingle_hashes(n) for n in normalized]
+        # 分块计算，避免百万级词库一次性展开占用过多内存
+        signatures = np.concatenate([
+            minhash_batch(hash_lists[i:i + BATCH_SIZE])
+            for i in range(0, len(hash_lists), BATCH_SIZE)
+        ]) if hash_lists else minhash_batch([])
+        with self.lock:
+            for item, norm, hashes, signature in zip(items, normalized, hash_lists, signatures):
+                if norm in self.exact:
+                    signature = None
+                prepared = (norm, hashes, signature)
+                self._insert(item, *prepared, self.query(norm, _prepared=prepared))
+            self._clusters = {}
+
+    # 包含两个及以上条目的近似重复聚类（按 limit 缓存，插入后失效）
+    def clusters(self, limit=None):
+        with self.lock:
+            limit = len(self.parent) if limit is None else limit
+            if limit not in self._clusters:
+                groups = {}
+                for item in self.parent:
+                    if item < limit:
+                        groups.setdefault(self._find(item), []).append(item)
+                self._clusters[limit] = [sorted(group) for group in groups.values() if len(group) > 1]
+            return self._clusters[limit]
+
+
+def build_keyword_index(keywords_df):
+    index = KeywordIndex()
+    index.add_many(list(keywords_df.index), keywords_df["关键词"].tolist())
+    return index
+
+
+# 某个词库版本看到的去重索引：共享索引的前 size 行
+class KeywordIndexView:
+    def __init__(self, index, size):
+        self.index = index
+        self.size = size
+
+    def query(self, keyword):
+        return self.index.query(keyword, limit=self.size)
+
+    def exact_items(self, keyword):
+        return self.index.exact_items(keyword, limit=self.size)
+
+    def clusters(self):
+        return self.index.clusters(limit=self.size)
+
+
+# 进程内共享的去重索引（条目为行号）：只保留一个可变索引，新版本相对索引中的关键词只在末尾追加时
+# 在锁内原地插入新增的关键词，单次新增的代价与词库大小无关；合并、修改等其他变化才整体重建，
+# 重建时旧索引不再修改，仍在使用旧版本的会话继续读取旧索引。
+# 已确认过的版本记录其行数，同一版本的其他会话直接取视图，无需再比较关键词
+class KeywordIndexCache:
+    def __init__(self):
+        self.index = KeywordIndex()
+        self.keywords = []
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, version, keywords_df):
+        with self._lock:
+            if version not in self._sizes:
+                keywords = keywords_df["关键词"].tolist()
+                n = len(self.keywords)
+                if len(keywords) <= n and keywords == self.keywords[:len(keywords)]:
+                    pass
+                elif keywords[:n] == self.keywords:
+                    self.index.add_many(range(n, len(keywords)), keywords[n:])
+                    self.keywords.extend(keywords[n:])
+                else:
+                    self.index = build_keyword_index(keywords_df.reset_index(drop=True))
+                    self.keywords = keywords
+                    self._sizes = {}
+                self._sizes[version] = len(keywords)
+            return KeywordIndexView(self.index, self._sizes[version])
+
+
+# 合并聚类：每个聚类保留搜索量最高的词为主词（保留原词写法），累加搜索量/点击量，其余条目删除；
+# 返回结果保留原行号，便于调用方同步其他按行号建立的索引
+def merge_keywords(keywords_df, clusters, updated_at):
+    result = keywords_df.copy()
+    removed = []
+    for items in clusters:
+        group = keywords_df.loc[items]
+        canonical = group["搜索量"].idxmax()
+        clicks = group["点击量"].sum()
+        result.at[canonical, "搜索量"] = group["搜索量"].sum()
+        result.at[canonical, "点击量"] = clicks
+        result.at[canonical, "转化率"] = (group["转化率"] * group["点击量"]).sum() / clicks if clicks else group["转化率"].mean()
+        result.at[canonical, "排名"] = group["排名"].min()
+        result.at[canonical, "CPC"] = group["CPC"].mean()
+        result.at[canonical, "更新时间"] = updated_at
+        removed.extend(i for i in items if i != canonical)
+    return result.drop(index=removed)
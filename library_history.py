@@ -0,0 +1,479 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_DIR
+from monitoring import tracked_keywords
+
+HISTORY_DIR = os.path.join(DATA_DIR, "library_history")
+
+# 检查点策略：距上一个检查点满 CHECKPOINT_INTERVAL 个版本，或累计变动行数超过检查点行数的
+# CHECKPOINT_CHURN 倍时写入新的全量检查点，其余版本只保存相对前一版本的按列增量
+CHECKPOINT_INTERVAL = 30
+CHECKPOINT_CHURN = 0.5
+
+# 首次启动时回放的历史天数
+WARM_UP_DAYS = 30
+
+# 被替换的版本文件（同一天重新记录）保留的时间（秒）：读取不加锁，其他会话可能仍在按旧清单读取这些文件，
+# 超过保留时间后由之后的写入删除
+GARBAGE_GRACE_SECONDS = 600
+
+STATE_CACHE_SIZE = 4
+RESULT_CACHE_SIZE = 16
+
+# 行 ID：关键词加入词库时分配一次，修改、合并时保持不变，删除后不再复用；作为各版本之间对齐行的键
+KEY_COLUMN = "ID"
+
+
+# 为没有 ID 的行（新增的关键词）从 next_id 起依次分配 ID，返回 (ID 列在首列的词库, 下一个可用 ID)
+def assign_ids(keywords_df, next_id):
+    keywords_df = keywords_df.reset_index(drop=True)
+    if KEY_COLUMN in keywords_df:
+        existing = keywords_df.pop(KEY_COLUMN)
+    else:
+        existing = pd.Series(np.nan, index=keywords_df.index)
+    missing = existing.isna().to_numpy()
+    ids = np.zeros(len(keywords_df), dtype=np.int64)
+    ids[~missing] = existing[~missing].astype(np.int64)
+    if len(np.unique(ids[~missing])) != (~missing).sum():
+        raise ValueError("词库中存在重复的 ID")
+    if (~missing).any():
+        next_id = max(next_id, int(ids[~missing].max()) + 1)
+    ids[missing] = np.arange(next_id, next_id + missing.sum())
+    keywords_df.insert(0, KEY_COLUMN, ids)
+    return keywords_df, next_id + int(missing.sum())
+
+
+# 逐元素比较两列取值是否不同（两侧均为空值视为相同）
+def _differs(old, new):
+    same = old == new
+    if old.dtype == object or new.dtype.kind == "f" or old.dtype.kind == "f":
+        same = same | (pd.isna(old) & pd.isna(new))
+    return ~np.asarray(same, dtype=bool)
+
+
+def _assign(values, positions, new_values):
+    if values.dtype != object and not np.can_cast(new_values.dtype, values.dtype, "same_kind"):
+        values = values.astype(np.result_type(values, new_values))
+    values[positions] = new_values
+    return values
+
+
+# 词库历史快照：以检查点为起点，每个版本的行在该检查点的“行空间”中位置固定
+# （新增行依次追加，删除只标记），因此增量只需记录新增行、删除的行号和每列变化的 (行号, 值)；
+# 重建时先按最终行数一次性分配数组，再依次写入各版本的增量，整体为 O(行数 + 变动数)
+class LibraryHistory:
+    def __init__(self, root=None, lock=None, checkpoint_interval=CHECKPOINT_INTERVAL,
+                 checkpoint_churn=CHECKPOINT_CHURN):
+        self.root = root or HISTORY_DIR
+        self.lock = lock or (lambda name: nullcontext())
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_churn = checkpoint_churn
+        self._states = OrderedDict()
+        self._results = OrderedDict()
+        self._cache_lock = threading.RLock()
+
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"versions": {}}
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._manifest_path()
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def _remove(self, relative_path):
+        path = os.path.join(self.root, relative_path)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    # 已记录的日期（升序）
+    def dates(self):
+        return [date.fromisoformat(day) for day in sorted(self._read_manifest()["versions"])]
+
+    def _version_on(self, versions, day):
+        candidates = [d for d in versions if d <= day.isoformat()]
+        return max(candidates) if candidates else None
+
+    # 某个版本在其检查点行空间中的状态：行 ID、各列取值、存活标记
+    def _state(self, versions, day):
+        with self._cache_lock:
+            return self._build_state(versions, day)
+
+    def _build_state(self, versions, day):
+        entry = versions[day]
+        cache_key = (day, entry["path"])
+        if cache_key in self._states:
+            self._states.move_to_end(cache_key)
+            return self._states[cache_key]
+
+        chain = sorted(d for d in versions if versions[d]["checkpoint"] == entry["checkpoint"] and d <= day)
+        # 从同一检查点内最近的已缓存版本开始重放
+        start = 0
+        base = None
+        for i in range(len(chain) - 1, 0, -1):
+            cached = self._states.get((chain[i], versions[chain[i]]["path"]))
+            if cached is not None:
+                start, base = i, cached
+                break
+        if base is None:
+            frame = pd.read_parquet(os.path.join(self.root, versions[chain[0]]["path"]))
+            base = {
+                "keys": frame[KEY_COLUMN].to_numpy(dtype=np.int64),
+                "values": {col: frame[col].to_numpy() for col in versions[chain[0]]["columns"]},
+                "alive": np.ones(len(frame), dtype=bool)
+            }
+
+        size = entry["size"]
+        used = len(base["alive"])
+        state = {
+            "keys": np.concatenate([base["keys"], np.zeros(size - used, dtype=np.int64)]),
+            "values": {
+                col: np.concatenate([values, np.zeros(size - used, dtype=values.dtype)])
+                if values.dtype != object else np.concatenate([values, np.empty(size - used, dtype=object)])
+                for col, values in base["values"].items()
+            },
+            "alive": np.concatenate([base["alive"], np.zeros(size - used, dtype=bool)])
+        }
+        for d in chain[start + 1:]:
+            self._apply_delta(state, versions[d], used)
+            used = versions[d]["size"]
+
+        self._states[cache_key] = state
+        while len(self._states) > STATE_CACHE_SIZE:
+            self._states.popitem(last=False)
+        return state
+
+    def _apply_delta(self, state, entry, used):
+        if entry["path"] is None:
+            return
+        path = os.path.join(self.root, entry["path"])
+        if entry["added"]:
+            added = pd.read_parquet(os.path.join(path, "added.parquet"))
+            positions = np.arange(used, used + len(added))
+            state["keys"][positions] = added[KEY_COLUMN].to_numpy(dtype=np.int64)
+            for col in state["values"]:
+                state["values"][col] = _assign(state["values"][col], positions, added[col].to_numpy())
+            state["alive"][positions] = True
+        if entry["removed"]:
+            removed = pd.read_parquet(os.path.join(path, "removed.parquet"))["行号"].to_numpy()
+            state["alive"][removed] = False
+        for col in entry["changed"]:
+            changed = pd.read_parquet(os.path.join(path, "changed", f"{col}.parquet"))
+            state["values"][col] = _assign(state["values"][col], changed["行号"].to_numpy(), changed["值"].to_numpy())
+
+    def _frame(self, versions, day):
+        entry = versions[day]
+        state = self._state(versions, day)
+        alive = state["alive"]
+        frame = pd.DataFrame({col: state["values"][col][alive] for col in entry["columns"]})
+        frame.insert(0, KEY_COLUMN, state["keys"][alive])
+        return frame
+
+    # 重建 day 当天（无记录时取之前最近的版本）的词库（含 ID 列），没有任何更早的版本时返回 None
+    def reconstruct(self, day):
+        versions = self._read_manifest()["versions"]
+        version = self._version_on(versions, day)
+        if version is None:
+            return None
+        return self._frame(versions, version)
+
+    # 版本标识：日期 + 版本文件路径（同一天重写会生成新路径），内容不同的版本标识一定不同
+    def _version_id(self, versions, day):
+        return f"{day}:{versions[day]['path']}"
+
+    # 最新版本的标识与词库（含 ID 列），没有任何版本时返回 (None, None)
+    def latest(self):
+        versions = self._read_manifest()["versions"]
+        if not versions:
+            return None, None
+        day = max(versions)
+        return self._version_id(versions, day), self._frame(versions, day)
+
+    # 记录 day 当天的词库版本，返回记录的词库（新增行已分配 ID）；
+    # 同一天重复记录时替换当天版本，只能追加不能早于最新版本
+    def record(self, keywords_df, day=None):
+        with self.lock("library-history"):
+            return self._record(self._read_manifest(), keywords_df, day)
+
+    # 在最新版本上应用一次修改并记录为 day 当天的版本：added 为新增的行（不含 ID），
+    # updated 为按 ID 修改的整行，removed 为删除的 ID。读取最新版本和写入在同一把锁内完成，
+    # 多个会话同时修改时不会用各自过期的词库互相覆盖；已被其他会话删除的行不会因修改而恢复。
+    # 返回 (版本标识, 修改后的词库)
+    def apply(self, added=None, updated=None, removed=(), day=None):
+        with self.lock("library-history"):
+            manifest = self._read_manifest()
+            versions = manifest["versions"]
+            if versions:
+                library = self._frame(versions, max(versions))
+            else:
+                library = pd.DataFrame(columns=[KEY_COLUMN])
+            library = library[~library[KEY_COLUMN].isin(list(removed))].reset_index(drop=True)
+            if updated is not None and len(updated):
+                positions = pd.Index(library[KEY_COLUMN]).get_indexer(updated[KEY_COLUMN])
+                found = positions >= 0
+                for col in updated.columns.drop(KEY_COLUMN):
+                    library.loc[positions[found], col] = updated[col].to_numpy()[found]
+            if added is not None and len(added):
+                library = pd.concat([library, added.drop(columns=KEY_COLUMN, errors="ignore")], ignore_index=True)
+            library = self._record(manifest, library, day)
+            return self._version_id(manifest["versions"], max(manifest["versions"])), library
+
+    def _record(self, manifest, keywords_df, day=None):
+        day = (day or date.today()).isoformat()
+        versions = manifest["versions"]
+        if versions and day < max(versions):
+            raise ValueError(f"词库历史只能追加，{day} 早于最新版本 {max(versions)}")
+        keywords_df, manifest["next_id"] = assign_ids(keywords_df, manifest.get("next_id", 1))
+        keys = keywords_df[KEY_COLUMN].to_numpy()
+        data = keywords_df.drop(columns=KEY_COLUMN)
+        columns = list(data.columns)
+        replaced = versions.pop(day, None)
+        previous = max(versions) if versions else None
+
+        entry = None
+        if previous is not None and versions[previous]["columns"] == columns:
+            prev_entry = versions[previous]
+            chain_length = sum(1 for e in versions.values() if e["checkpoint"] == prev_entry["checkpoint"])
+            if chain_length < self.checkpoint_interval:
+                entry = self._write_delta(versions, previous, day, keys, data)
+                checkpoint_rows = versions[prev_entry["checkpoint"]]["rows"]
+                if entry["churn"] > self.checkpoint_churn * max(checkpoint_rows, 1):
+                    if entry["path"]:
+                        self._remove(entry["path"])
+                    entry = None
+        if entry is None:
+            entry = self._write_checkpoint(day, keys, data)
+
+        versions[day] = entry
+        garbage = manifest.get("garbage", [])
+        if replaced and replaced["path"]:
+            garbage.append({"path": replaced["path"], "replaced_at": time.time()})
+        expired = [g for g in garbage if time.time() - g["replaced_at"] > GARBAGE_GRACE_SECONDS]
+        manifest["garbage"] = [g for g in garbage if g not in expired]
+        self._write_manifest(manifest)
+        for g in expired:
+            self._remove(g["path"])
+        return keywords_df
+
+    def _write_checkpoint(self, day, keys, keywords_df):
+        relative_path = os.path.join("checkpoints", f"{day}-{uuid.uuid4().hex[:8]}.parquet")
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        frame = keywords_df.copy()
+        frame.insert(0, KEY_COLUMN, keys)
+        frame.to_parquet(path, index=False)
+        return {
+            "kind": "checkpoint", "checkpoint": day, "path": relative_path,
+            "columns": list(keywords_df.columns), "rows": len(frame), "size": len(frame),
+            "added": 0, "removed": 0, "changed": {}, "churn": 0
+        }
+
+    # 与前一版本按列比较，只写出变化的部分
+    def _write_delta(self, versions, previous, day, keys, keywords_df):
+        prev_entry = versions[previous]
+        state = self._state(versions, previous)
+        alive_ids = np.flatnonzero(state["alive"])
+        positions = pd.Index(state["keys"][alive_ids]).get_indexer(keys)
+        matched = positions >= 0
+        ids = alive_ids[positions[matched]]
+        removed = np.setdiff1d(alive_ids, ids)
+        added = keywords_df[~matched].copy()
+        added.insert(0, KEY_COLUMN, keys[~matched])
+
+        changed = {}
+        for col in prev_entry["columns"]:
+            new_values = keywords_df[col].to_numpy()[matched]
+            mask = _differs(state["values"][col][ids], new_values)
+            if mask.any():
+                changed[col] = pd.DataFrame({"行号": ids[mask], "值": new_values[mask]})
+
+        changed_rows = len(np.unique(np.concatenate([c["行号"].to_numpy() for c in changed.values()]))) if changed else 0
+        entry = {
+            "kind": "delta", "checkpoint": prev_entry["checkpoint"], "path": None,
+            "columns": prev_entry["columns"], "rows": len(keywords_df), "size": prev_entry["size"] + len(added),
+            "added": len(added), "removed": len(removed),
+            "changed": {col: len(c) for col, c in changed.items()},
+            "churn": prev_entry["churn"] + len(added) + len(removed) + changed_rows
+        }
+        if not (len(added) or len(removed) or changed):
+            return entry
+
+        relative_path = os.path.join("deltas", f"{day}-{uuid.uuid4().hex[:8]}")
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.join(path, "changed"), exist_ok=True)
+        if len(added):
+            added.to_parquet(os.path.join(path, "added.parquet"), index=False)
+        if len(removed):
+            pd.DataFrame({"行号": removed}).to_parquet(os.path.join(path, "removed.parquet"), index=False)
+        for col, frame in changed.items():
+            frame.to_parquet(os.path.join(path, "changed", f"{col}.parquet"), index=False)
+        entry["path"] = relative_path
+        return entry
+
+    # 按版本缓存计算结果：版本一经写入不再修改（同一天重写会生成新路径），缓存无需失效
+    def _cached(self, name, versions, days, compute):
+        key = (name,) + tuple((day, versions[day]["path"]) if day else None for day in days)
+        with self._cache_lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+            result = compute()
+            self._results[key] = result
+            while len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return result
+
+    # 两个日期之间的词库整体指标对比（见 library_kpis）
+    def kpis(self, start, end):
+        versions = self._read_manifest()["versions"]
+        old_version, new_version = self._version_on(versions, start), self._version_on(versions, end)
+        if new_version is None:
+            return []
+        return self._cached("kpis", versions, (old_version, new_version), lambda: library_kpis(
+            self._frame(versions, new_version),
+            self._frame(versions, old_version) if old_version else None
+        ))
+
+    # 两个日期之间的差异：新增、删除的关键词，排名变化和状态变化
+    def diff(self, start, end):
+        versions = self._read_manifest()["versions"]
+        old_version, new_version = self._version_on(versions, start), self._version_on(versions, end)
+        return self._cached("diff", versions, (old_version, new_version),
+                            lambda: self._diff(versions, old_version, new_version))
+
+    def _diff(self, versions, old_version, new_version):
+        new = self._frame(versions, new_version) if new_version else None
+        old = self._frame(versions, old_version) if old_version else None
+        if new is None:
+            new = pd.DataFrame(columns=[KEY_COLUMN] + (list(old.columns[1:]) if old is not None else ["关键词"]))
+        if old is None:
+            old = new.iloc[:0]
+
+        positions = pd.Index(old[KEY_COLUMN]).get_indexer(new[KEY_COLUMN])
+        matched = positions >= 0
+        common_new = new[matched].reset_index(drop=True)
+        common_old = old.iloc[positions[matched]].reset_index(drop=True)
+        removed_mask = np.ones(len(old), dtype=bool)
+        removed_mask[positions[matched]] = False
+
+        rank_changed = _differs(common_old["排名"].to_numpy(), common_new["排名"].to_numpy())
+        rank_changes = pd.DataFrame({
+            "关键词": common_new.loc[rank_changed, "关键词"],
+            "原排名": common_old.loc[rank_changed, "排名"],
+            "现排名": common_new.loc[rank_changed, "排名"]
+        })
+        rank_changes["变化"] = rank_changes["现排名"] - rank_changes["原排名"]
+        rank_changes = rank_changes.reindex(rank_changes["变化"].abs().sort_values(ascending=False).index)
+
+        status_changed = _differs(common_old["状态"].to_numpy(), common_new["状态"].to_numpy())
+        status_changes = pd.DataFrame({
+            "关键词": common_new.loc[status_changed, "关键词"],
+            "原状态": common_old.loc[status_changed, "状态"],
+            "现状态": common_new.loc[status_changed, "状态"]
+        })
+        return {
+            "新增": new[~matched].drop(columns=KEY_COLUMN).reset_index(drop=True),
+            "删除": old[removed_mask].drop(columns=KEY_COLUMN).reset_index(drop=True),
+            "排名变化": rank_changes.reset_index(drop=True),
+            "状态变化": status_changes.reset_index(drop=True)
+        }
+
+    # 历史快照占用的磁盘空间（字节）
+    def storage_bytes(self):
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        return total
+
+    # 首次启动时用模拟的每日变化回放最近 days 天的历史（截至昨天），已有历史时不做任何事
+    def backfill(self, keywords_df, days=WARM_UP_DAYS, today=None):
+        today = today or date.today()
+        with self.lock("library-history-backfill"):
+            if self._read_manifest()["versions"]:
+                return
+            library = keywords_df.reset_index(drop=True)
+            for offset in range(days, 0, -1):
+                day = today - timedelta(days=offset)
+                if offset != days:
+                    library = simulate_library_drift(library, day)
+                library = self.record(library, day)
+
+
+# 模拟词库的每日变化：排名与搜索量波动、少量状态变化、新增与删除关键词，按日期固定随机种子；
+# 新增的关键词没有 ID，记录时分配
+def simulate_library_drift(keywords_df, day):
+    rng = np.random.default_rng(int(day.strftime("%Y%m%d")))
+    library = keywords_df.copy()
+    n = len(library)
+    updated_at = f"{day.isoformat()} 09:00:00"
+
+    moved = rng.random(n) < 0.3
+    library.loc[moved, "排名"] = np.clip(library.loc[moved, "排名"] + rng.integers(-3, 4, moved.sum()), 1, 100)
+    library.loc[moved, "搜索量"] = (library.loc[moved, "搜索量"] * rng.uniform(0.9, 1.1, moved.sum())).astype(int)
+    status_changed = rng.random(n) < 0.03
+    library.loc[status_changed, "状态"] = rng.choice(["启用", "暂停", "删除"], status_changed.sum())
+    library.loc[moved | status_changed, "更新时间"] = updated_at
+    library = library[rng.random(n) >= 0.01]
+
+    candidates = sorted(set(tracked_keywords()) - set(library["关键词"]))
+    count = min(rng.poisson(1), len(candidates))
+    if count:
+        library = pd.concat([library, pd.DataFrame({
+            "关键词": rng.choice(candidates, count, replace=False),
+            "搜索量": rng.integers(1000, 10000, count),
+            "点击量": rng.integers(100, 1000, count),
+            "转化率": rng.uniform(0.01, 0.1, count),
+            "排名": rng.integers(1, 50, count),
+            "CPC": rng.uniform(1, 10, count),
+            "状态": "启用",
+            "优先级": rng.choice(["高", "中", "低"], count),
+            "更新时间": updated_at
+        })], ignore_index=True)
+    return library.reset_index(drop=True)
+
+
+# 词库整体指标（关键词总数、启用数、平均排名、总搜索量）与对比日期的差值
+def library_kpis(current, previous):
+    def summarize(df):
+        return {
+            "关键词总数": len(df),
+            "启用关键词": int((df["状态"] == "启用").sum()),
+            "平均排名": float(df["排名"].mean()) if len(df) else 0.0,
+            "总搜索量": int(df["搜索量"].sum())
+        }
+
+    cur = summarize(current)
+    prev = summarize(previous) if previous is not None else None
+    volume_delta = (cur["总搜索量"] / prev["总搜索量"] - 1) if prev and prev["总搜索量"] else None
+    return [
+        {"label": "关键词总数", "value": f"{cur['关键词总数']:,}",
+         "delta": f"{cur['关键词总数'] - prev['关键词总数']:+d}" if prev else None},
+        {"label": "启用关键词", "value": f"{cur['启用关键词']:,}",
+         "delta": f"{cur['启用关键词'] - prev['启用关键词']:+d}" if prev else None},
+        {"label": "平均排名", "value": f"{cur['平均排名']:.1f}",
+         "delta": f"{cur['平均排名'] - prev['平均排名']:+.1f}" if prev else None},
+        {"label": "总搜索量", "value": f"{cur['总搜索量']:,}",
+         "delta": f"{volume_delta:+.0%}" if volume_delta is not None else None}
+    ]
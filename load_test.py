@@ -0,0 +1,476 @@
+import argparse
+import json
+import logging
+import os
+import pickle
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import numpy as np
+import streamlit
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(PROJECT_DIR, "app.py")
+# 结果写入配置的数据目录（与 config.DATA_DIR 相同的规则）；这里不导入 config，
+# 以便压测在应用模块导入 config 之前把 SEO_DATA_DIR 切换到临时目录
+LOADTEST_DIR = os.path.join(os.environ.get("SEO_DATA_DIR", os.path.join(PROJECT_DIR, "data")), "loadtest")
+
+# SessionDriver 覆盖了 AppTest 的私有方法 _run，只在验证过的 Streamlit 版本上运行
+SUPPORTED_STREAMLIT = "1.33."
+
+# 结果文件格式版本，字段变化时递增，compare 时校验
+RESULT_SCHEMA = 1
+
+PERCENTILES = [50, 95, 99]
+
+# 导航脚本：每一步为 (控件类型, 控件标签, 取值)，按钮没有取值；
+# 每次操作对应一次完整的脚本重跑，与浏览器中用户的一次交互一致
+SCENARIOS = {
+    "词库管理": {
+        "weight": 4,
+        "steps": [
+            ("radio", "选择功能模块", "词库管理"),
+            ("multiselect", "状态", ["启用"]),
+            ("multiselect", "优先级", ["高", "中"]),
+            ("text_input", "搜索关键词", "云"),
+            ("multiselect", "标签", ["产品词"]),
+            ("radio", "标签匹配方式", "任一满足"),
+            ("text_input", "搜索关键词", "")
+        ]
+    },
+    "智能扩充": {
+        "weight": 2,
+        "steps": [
+            ("radio", "选择功能模块", "智能扩充"),
+            ("text_input", "输入关键词", "云服务器"),
+            ("selectbox", "扩充方式", "长尾词发现"),
+            ("slider", "最小搜索量", 500),
+            ("button", "开始扩充")
+        ]
+    },
+    "查询分析": {
+        "weight": 2,
+        "steps": [
+            ("radio", "选择功能模块", "查询分析"),
+            ("text_input", "输入要查询的关键词", "云数据库"),
+            ("text_input", "输入要查询的关键词", "对象存储")
+        ]
+    },
+    "数据报告": {
+        "weight": 2,
+        "steps": [
+            ("radio", "选择功能模块", "数据报告"),
+            ("selectbox", "报告类型", "周报"),
+            ("selectbox", "报告类型", "月报"),
+            ("selectbox", "选择分析场景", "预算分配建议"),
+            ("selectbox", "报告类型", "竞品分析")
+        ]
+    }
+}
+
+
+# 所有会话共享一个模拟 Runtime 和脚本字节码缓存（与真实服务端一致）。
+# AppTest 每次运行都会替换并清空全局 Runtime、并重新编译脚本，多个会话并发运行时
+# 会互相干扰（并发 compile 会触发 SystemError），因此这里跳过这些全局状态的切换，其余与 AppTest.run 相同
+SCRIPT_CACHE = ScriptCache()
+
+
+def install_runtime():
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+
+class SessionDriver(AppTest):
+    def __init__(self, *args, **kwargs):
+        if not streamlit.__version__.startswith(SUPPORTED_STREAMLIT):
+            raise RuntimeError(
+                f"load_test 依赖 Streamlit {SUPPORTED_STREAMLIT}x 的 AppTest 内部实现，当前版本为 {streamlit.__version__}，"
+                "请核对 AppTest._run 后更新 SessionDriver 与 SUPPORTED_STREAMLIT"
+            )
+        super().__init__(*args, **kwargs)
+
+    def _run(self, widget_state=None, timeout=None):
+        script_runner = LocalScriptRunner(self._script_path, self.session_state, args=self.args, kwargs=self.kwargs)
+        script_runner._script_cache = SCRIPT_CACHE
+        self._tree = script_runner.run(
+            widget_state, self.query_params, timeout or self.default_timeout, self._page_hash
+        )
+        self._tree._runner = self
+        return self
+
+
+def _find_widget(at, kind, label):
+    for widget in getattr(at, kind):
+        if widget.label == label:
+            return widget
+    raise LookupError(f"页面上没有找到控件: {kind} '{label}'")
+
+
+# 执行一步操作并返回是否出错（控件不存在、脚本异常或超时）
+def perform(at, step):
+    kind, label, *value = step
+    widget = _find_widget(at, kind, label)
+    if kind == "button":
+        widget.click()
+    else:
+        widget.set_value(value[0])
+    at.run()
+    return len(at.exception) > 0
+
+
+# 当前进程的常驻内存（MB）：Linux 读取 /proc，其他平台退化为峰值常驻内存
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (FileNotFoundError, ValueError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+
+# 当前进程内各线程已使用的 CPU 时间（秒），按线程名汇总；仅 Linux 可用，其他平台返回空
+def thread_cpu_seconds(threads):
+    ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+    usage = {}
+    for thread in threads:
+        try:
+            with open(f"/proc/self/task/{thread.native_id}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (FileNotFoundError, ProcessLookupError, IndexError, TypeError):
+            continue
+        usage[thread.name] = usage.get(thread.name, 0) + (int(fields[11]) + int(fields[12])) / ticks
+    return usage
+
+
+# 后台服务线程：报告调度、关键词监控、锁心跳、进程池管理线程等，与会话在同一进程内运行，
+# 它们的 CPU 计入进程 CPU 使用率，单独记录以区分会话本身的负载
+def background_threads():
+    return [
+        thread for thread in threading.enumerate()
+        if thread is not threading.main_thread() and not thread.name.startswith("loadtest-")
+    ]
+
+
+# 会话状态序列化后的大小（KB），近似每个会话独占的数据量
+def session_state_kb(at):
+    total = 0
+    for key in at.session_state.filtered_state:
+        try:
+            total += len(pickle.dumps(at.session_state[key], protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            continue
+    return total / 1024
+
+
+# 资源采样：按固定间隔记录进程 CPU 使用率（所有线程合计，100% = 一个核）与常驻内存
+class ResourceSampler:
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        start = last_wall = time.perf_counter()
+        last_cpu = time.process_time()
+        while not self._stop.wait(self.interval):
+            wall, cpu = time.perf_counter(), time.process_time()
+            self.samples.append({
+                "t": round(wall - start, 3),
+                "cpu_percent": round((cpu - last_cpu) / (wall - last_wall) * 100, 1),
+                "rss_mb": round(current_rss_mb(), 1)
+            })
+            last_wall, last_cpu = wall, cpu
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="loadtest-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+# 单个模拟会话：打开页面后按权重随机选择导航脚本循环执行，步骤之间模拟思考时间
+def run_session(session_id, deadline, think_time, seed, records, states, timeout):
+    rng = random.Random(seed + session_id)
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name]["weight"] for name in names]
+    at = SessionDriver(APP_PATH, default_timeout=timeout)
+
+    def timed(scenario, step, action):
+        started = time.perf_counter()
+        try:
+            error = action()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        records.append({
+            "session": session_id,
+            "scenario": scenario,
+            "step": f"{step[0]}:{step[1]}",
+            "start": started,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "error": error if isinstance(error, str) else ("exception" if error else None)
+        })
+
+    timed("打开页面", ("run", "初始加载", None), lambda: len(at.run().exception) > 0)
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        for step in SCENARIOS[scenario]["steps"]:
+            if time.perf_counter() >= deadline:
+                break
+            timed(scenario, step, lambda: perform(at, step))
+            if think_time:
+                time.sleep(rng.uniform(*think_time))
+    states[session_id] = session_state_kb(at)
+
+
+def _percentiles(values):
+    if len(values) == 0:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": round(float(np.percentile(values, p)), 1) for p in PERCENTILES}
+
+
+def _latency_summary(records):
+    latencies = np.array([r["latency_ms"] for r in records])
+    return {
+        "count": len(records),
+        "errors": sum(1 for r in records if r["error"]),
+        **_percentiles(latencies),
+        "mean": round(float(latencies.mean()), 1) if len(latencies) else None,
+        "max": round(float(latencies.max()), 1) if len(latencies) else None
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(APP_PATH),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# 设置应用的数据目录：默认新建临时目录，压测中的词库写入、报告物化、监控告警和导出都不会改动真实数据。
+# 应用模块在导入 config 时读取 SEO_DATA_DIR，因此必须在第一次运行 app.py 之前调用
+def use_data_dir(data_dir=None):
+    if "config" in sys.modules:
+        raise RuntimeError("config 已被导入，无法再切换数据目录，请在新进程中运行压测")
+    data_dir = os.path.abspath(data_dir) if data_dir else tempfile.mkdtemp(prefix="seo-loadtest-")
+    os.environ["SEO_DATA_DIR"] = data_dir
+    return data_dir
+
+
+# 运行一轮压测：先用单个会话预热（填充进程级缓存、启动后台服务），
+# 再在 ramp_up 秒内依次启动 sessions 个并发会话，持续 duration 秒；
+# data_dir 为空时使用临时数据目录
+def run_load_test(sessions=10, duration=60, ramp_up=5, think_time=(0.5, 2.0), seed=0, timeout=120, data_dir=None):
+    data_dir = use_data_dir(data_dir)
+    with patch_config_options({"global.appTest": True}):
+        install_runtime()
+        warm_up = SessionDriver(APP_PATH, default_timeout=timeout).run()
+        for scenario in SCENARIOS.values():
+            for step in scenario["steps"]:
+                perform(warm_up, step)
+        baseline_rss = current_rss_mb()
+
+        records, states = [], {}
+        background = background_threads()
+        background_cpu = thread_cpu_seconds(background)
+        children_cpu = os.times().children_user + os.times().children_system
+        sampler = ResourceSampler().start()
+        started = time.perf_counter()
+        deadline = started + ramp_up + duration
+        threads = []
+        for session_id in range(sessions):
+            thread = threading.Thread(
+                target=run_session,
+                args=(session_id, deadline, think_time, seed, records, states, timeout),
+                name=f"loadtest-session-{session_id}",
+                daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+            time.sleep(ramp_up / sessions)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        samples = sampler.stop()
+        background_cpu = {
+            name: round(seconds - background_cpu.get(name, 0), 2)
+            for name, seconds in thread_cpu_seconds(background).items()
+        }
+        # 进程池（报告物化、导出）的子进程 CPU 在进程池关闭回收后才计入
+        children_cpu = os.times().children_user + os.times().children_system - children_cpu
+
+    peak_rss = max([s["rss_mb"] for s in samples] + [current_rss_mb()])
+    cpu = np.array([s["cpu_percent"] for s in samples]) if samples else np.zeros(1)
+    # 吞吐量只统计全部会话启动之后的稳态区间，延迟统计全部重跑（含首次加载）
+    steady = [r for r in records if r["start"] >= started + ramp_up]
+    return {
+        "schema": RESULT_SCHEMA,
+        "meta": {
+            "revision": _git_revision(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "streamlit": streamlit.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "sessions": sessions,
+            "duration": duration,
+            "ramp_up": ramp_up,
+            "think_time": list(think_time) if think_time else None,
+            "seed": seed,
+            "data_dir": data_dir,
+            # 后台服务与会话共享进程：压测期间各后台线程及进程池子进程的 CPU 秒数，
+            # 这部分负载会计入 CPU 使用率并与会话争用 GIL，解读延迟和吞吐时需要考虑
+            "background": {
+                "threads": sorted({thread.name for thread in background}),
+                "thread_cpu_s": background_cpu,
+                "thread_cpu_percent": round(sum(background_cpu.values()) / elapsed * 100, 1),
+                "child_process_cpu_s": round(children_cpu, 2)
+            }
+        },
+        "summary": {
+            "elapsed_s": round(elapsed, 1),
+            "reruns": len(records),
+            "throughput_rps": round(len(steady) / duration, 2) if duration else None,
+            "latency_ms": _latency_summary(records),
+            "error_rate": round(sum(1 for r in records if r["error"]) / len(records), 4) if records else 0.0,
+            "cpu_percent_mean": round(float(cpu.mean()), 1),
+            "cpu_percent_p95": round(float(np.percentile(cpu, 95)), 1),
+            # 所有会话共享一个进程，脚本执行受 GIL 限制，接近 100% 即单核饱和
+            "cpu_saturation": round(float(np.mean(cpu >= 90)), 3),
+            "baseline_rss_mb": round(baseline_rss, 1),
+            "peak_rss_mb": round(peak_rss, 1),
+            "rss_per_session_mb": round((peak_rss - baseline_rss) / sessions, 2),
+            "session_state_kb": round(float(np.mean(list(states.values()))), 1) if states else None
+        },
+        "by_page": {
+            page: _latency_summary([r for r in records if r["scenario"] == page])
+            for page in ["打开页面", *SCENARIOS]
+        },
+        "by_step": {
+            step: _latency_summary([r for r in records if r["step"] == step])
+            for step in sorted({r["step"] for r in records})
+        },
+        "errors": sorted({r["error"] for r in records if r["error"]}),
+        "samples": samples
+    }
+
+
+# 对比两次压测结果的关键指标（如不同版本），返回 [(指标, 旧值, 新值, 变化比例)]
+def compare_results(old, new):
+    if old.get("schema") != new.get("schema"):
+        raise ValueError(f"结果格式版本不一致: {old.get('schema')} != {new.get('schema')}")
+
+    def flatten(result):
+        summary = dict(result["summary"])
+        metrics = {f"latency_ms.{k}": v for k, v in summary.pop("latency_ms").items()}
+        metrics.update(summary)
+        for page, stats in result["by_page"].items():
+            for p in PERCENTILES:
+                metrics[f"{page}.p{p}"] = stats[f"p{p}"]
+        return metrics
+
+    before, after = flatten(old), flatten(new)
+    rows = []
+    for name in before:
+        a, b = before[name], after.get(name)
+        change = (b - a) / a if isinstance(a, (int, float)) and isinstance(b, (int, float)) and a else None
+        rows.append((name, a, b, change))
+    return rows
+
+
+def _print_summary(result):
+    summary = result["summary"]
+    latency = summary["latency_ms"]
+    print(f"会话数 {result['meta']['sessions']}，持续 {result['meta']['duration']}s，版本 {result['meta']['revision']}")
+    print(f"重跑延迟 p50/p95/p99: {latency['p50']} / {latency['p95']} / {latency['p99']} ms")
+    print(f"吞吐量: {summary['throughput_rps']} 次/秒，错误率: {summary['error_rate']:.2%}")
+    print(f"CPU 平均 {summary['cpu_percent_mean']}%（饱和占比 {summary['cpu_saturation']:.0%}），"
+          f"每会话内存 {summary['rss_per_session_mb']} MB（会话状态 {summary['session_state_kb']} KB）")
+    background = result["meta"]["background"]
+    print(f"后台服务（{', '.join(background['threads']) or '无'}）CPU {background['thread_cpu_percent']}%，"
+          f"子进程 {background['child_process_cpu_s']}s")
+    for page, stats in result["by_page"].items():
+        print(f"  {page}: {stats['count']} 次，p95 {stats['p95']} ms，错误 {stats['errors']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="并发会话压测")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="运行压测并输出 JSON 结果")
+    run_parser.add_argument("--sessions", type=int, default=10)
+    run_parser.add_argument("--duration", type=float, default=60)
+    run_parser.add_argument("--ramp-up", type=float, default=5)
+    run_parser.add_argument("--think-time", type=float, nargs=2, default=[0.5, 2.0],
+                            help="两次操作之间的思考时间范围（秒），0 0 表示不等待")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--timeout", type=float, default=120)
+    run_parser.add_argument("--output", default=None)
+    run_parser.add_argument("--data-dir", default=None,
+                            help="应用数据目录，默认使用运行结束后删除的临时目录；传入 data 可对真实数据压测")
+
+    compare_parser = subparsers.add_parser("compare", help="对比两次压测结果")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    args = parser.parse_args()
+    # 会话线程不是脚本线程，屏蔽由此产生的 "missing ScriptRunContext" 警告
+    logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage()
+    )
+
+    if args.command == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        print(f"{'指标':<24}{old['meta']['revision'] or '旧':>12}{new['meta']['revision'] or '新':>12}{'变化':>10}")
+        for name, a, b, change in compare_results(old, new):
+            print(f"{name:<24}{str(a):>12}{str(b):>12}{'' if change is None else f'{change:+.1%}':>10}")
+    elif args.command == "run":
+        result = run_load_test(
+            sessions=args.sessions,
+            duration=args.duration,
+            ramp_up=args.ramp_up,
+            think_time=tuple(args.think_time) if any(args.think_time) else None,
+            seed=args.seed,
+            timeout=args.timeout,
+            data_dir=args.data_dir
+        )
+        output = args.output or os.path.join(
+            LOADTEST_DIR, f"loadtest-{datetime.now():%Y%m%d-%H%M%S}-{result['meta']['revision'] or 'local'}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        _print_summary(result)
+        print(f"结果已写入: {output}")
+        if args.data_dir is None:
+            shutil.rmtree(result["meta"]["data_dir"], ignore_errors=True)
+    else:
+        parser.print_help()
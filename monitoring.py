@@ -0,0 +1,419 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from config import DATA_DIR
+from reports import PRODUCTS, format_kpis
+
+logger = logging.getLogger(__name__)
+
+MONITORING_DIR = os.path.join(DATA_DIR, "monitoring")
+ALERTS_DIR = os.path.join(MONITORING_DIR, "alerts")
+STATE_PATH = os.path.join(MONITORING_DIR, "detector_state.npz")
+SUMMARY_PATH = os.path.join(MONITORING_DIR, "hourly_summary.jsonl")
+
+METRICS = ["排名", "流量", "转化量"]
+ALERT_COLUMNS = ["时间", "关键词", "指标", "类型", "级别", "当前值", "基线", "z值"]
+MODIFIERS = ["", "价格", "教程", "配置", "优惠", "对比", "入门", "使用", "案例", "文档", "问题"]
+
+RANK_BUCKETS = ["1-3名", "4-10名", "11-30名", "30名以后"]
+
+# 首次启动时回放的历史小时数，以及其中写出告警的最近小时数
+WARM_UP_HOURS = 72
+WARM_UP_ALERT_HOURS = 24
+
+# 实时看板保留的小时数；首次读取汇总文件时只读末尾，每行按不超过 512 字节估算
+LIVE_WINDOW_HOURS = 72
+SUMMARY_LINE_BYTES = 512
+
+
+# 监控的关键词集合（模拟）
+def tracked_keywords():
+    return [f"{product}{modifier}" for product in PRODUCTS for modifier in MODIFIERS]
+
+
+# 模拟某个整点所有关键词的指标，按小时固定随机种子；
+# 少量关键词会被注入排名骤降、转化骤降等异常，with_anomalies 为 True 时同时返回注入位置
+def simulate_hourly_metrics(hour, n, with_anomalies=False):
+    base = np.random.default_rng(0)
+    base_rank = base.integers(1, 30, n)
+    base_traffic = base.uniform(50, 500, n)
+    base_conversion_rate = base.uniform(0.02, 0.08, n)
+
+    rng = np.random.default_rng(int(hour.strftime("%Y%m%d%H")))
+    diurnal = 1 + 0.2 * np.sin((hour.hour - 8) / 24 * 2 * np.pi)
+    rank = np.clip(base_rank + rng.integers(-1, 2, n), 1, None).astype(np.float32)
+    traffic = base_traffic * diurnal * rng.uniform(0.85, 1.15, n)
+    conversions = traffic * base_conversion_rate * rng.uniform(0.8, 1.2, n)
+
+    rank_drop = rng.random(n) < 0.002
+    rank[rank_drop] += rng.integers(12, 25, rank_drop.sum())
+    conversion_drop = rng.random(n) < 0.002
+    conversions[conversion_drop] *= 0.1
+    values = {
+        "排名": rank,
+        "流量": traffic.astype(np.float32),
+        "转化量": conversions.astype(np.float32)
+    }
+    if with_anomalies:
+        return values, {"排名下跌": rank_drop, "转化骤降": conversion_drop}
+    return values
+
+
+# 某个整点全部关键词的汇总指标（可加的合计值），写入汇总文件供实时看板增量读取
+def summarize_hour(hour, values, alerts):
+    rank = values["排名"]
+    buckets = np.bincount(np.searchsorted([3, 10, 30], rank, side="left"), minlength=len(RANK_BUCKETS))
+    return {
+        "时间": hour.strftime("%Y-%m-%d %H:%M"),
+        "流量": round(float(values["流量"].sum()), 2),
+        "转化量": round(float(values["转化量"].sum()), 2),
+        "排名合计": float(rank.sum()),
+        "排名词数": len(rank),
+        **{label: int(count) for label, count in zip(RANK_BUCKETS, buckets)},
+        "告警数": len(alerts)
+    }
+
+
+# 流式异常检测：每个序列只保存 EWMA 均值与 EWMA 绝对偏差（稳健尺度），O(1) 内存；
+# 每个整点对所有关键词做一次向量化更新。
+# 转化量低于基线的 conversion_drop_ratio 即为骤降，不再要求 z 值同时越限（转化量波动大，
+# 稳健尺度偏宽，两者同时满足会漏掉大部分骤降）；基线低于 min_conversion_baseline 的低量词不判定
+class StreamingDetector:
+    def __init__(self, keywords, alpha=0.1, z_threshold=4.0, min_periods=24,
+                 rank_jump=10, conversion_drop_ratio=0.5, min_conversion_baseline=1.0):
+        n = len(keywords)
+        self.keywords = np.asarray(keywords)
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_periods = min_periods
+        self.rank_jump = rank_jump
+        self.conversion_drop_ratio = conversion_drop_ratio
+        self.min_conversion_baseline = min_conversion_baseline
+        self.count = np.zeros(n, dtype=np.int32)
+        self.mean = {metric: np.zeros(n, dtype=np.float32) for metric in METRICS}
+        self.mad = {metric: np.zeros(n, dtype=np.float32) for metric in METRICS}
+
+    # 输入本时刻各指标的数组（与 keywords 对齐），返回告警 DataFrame
+    def update(self, timestamp, values):
+        ready = self.count >= self.min_periods
+        first = self.count == 0
+        alerts = []
+
+        for metric in METRICS:
+            x = np.asarray(values[metric], dtype=np.float32)
+            mean, mad = self.mean[metric], self.mad[metric]
+            scale = 1.4826 * mad + 1e-6
+            dev = x - mean
+            z = dev / scale
+
+            if metric == "排名":
+                # 排名数值变大即为下跌；核心词（基线前 3）跌出前 10 视为严重
+                core_drop = (mean <= 3) & (x > 10)
+                mask = ready & ((dev >= self.rank_jump) | core_drop)
+                severity = np.where(core_drop, "严重", "警告")
+                kind = "排名下跌"
+            elif metric == "转化量":
+                mask = ready & (mean >= self.min_conversion_baseline) & (x < mean * self.conversion_drop_ratio)
+                severity = np.full(len(x), "严重")
+                kind = "转化骤降"
+            else:
+                mask = ready & (np.abs(z) >= self.z_threshold)
+                severity = np.full(len(x), "警告")
+                kind = "流量异常"
+
+            idx = np.flatnonzero(mask)
+            if len(idx):
+                alerts.append(pd.DataFrame({
+                    "时间": timestamp.strftime("%Y-%m-%d %H:%M"),
+                    "关键词": self.keywords[idx],
+                    "指标": metric,
+                    "类型": kind,
+                    "级别": severity[idx],
+                    "当前值": np.round(x[idx], 2),
+                    "基线": np.round(mean[idx], 2),
+                    "z值": np.round(z[idx], 1)
+                }))
+
+            # 偏差截断后再更新，避免异常点污染基线
+            limit = self.z_threshold * scale
+            clipped = np.where(ready, np.clip(dev, -limit, limit), dev)
+            mean += self.alpha * clipped
+            mad += self.alpha * (np.abs(clipped) - mad)
+            mean[first] = x[first]
+            mad[first] = 0
+
+        self.count += 1
+        if not alerts:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        return pd.concat(alerts, ignore_index=True)
+
+    def save(self, path, last_tick):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            keywords=self.keywords,
+            count=self.count,
+            last_tick=np.array(last_tick.isoformat()),
+            **{f"mean_{m}": self.mean[m] for m in METRICS},
+            **{f"mad_{m}": self.mad[m] for m in METRICS}
+        )
+        os.replace(tmp_path, path)
+
+    # 读取保存的状态，关键词集合不一致时返回 None
+    def load(self, path):
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as state:
+            if not np.array_equal(state["keywords"], self.keywords):
+                return None
+            self.count = state["count"]
+            self.mean = {m: state[f"mean_{m}"] for m in METRICS}
+            self.mad = {m: state[f"mad_{m}"] for m in METRICS}
+            return datetime.fromisoformat(str(state["last_tick"]))
+
+
+# 告警写入本地 JSONL 文件，按天分文件
+class JsonlAlertSink:
+    def __init__(self, root=None):
+        self.root = root or ALERTS_DIR
+
+    def _path(self, day):
+        return os.path.join(self.root, f"alerts-{day.isoformat()}.jsonl")
+
+    def write(self, alerts):
+        if alerts.empty:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        for day, group in alerts.groupby(alerts["时间"].str[:10]):
+            with open(self._path(datetime.strptime(day, "%Y-%m-%d").date()), "a", encoding="utf-8") as f:
+                for record in group.to_dict("records"):
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    # 最近若干小时的告警，按时间倒序
+    def read_recent(self, hours=24, now=None):
+        now = now or datetime.now()
+        since = (now - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M")
+        frames = []
+        day = (now - timedelta(hours=hours)).date()
+        while day <= now.date():
+            path = self._path(day)
+            if os.path.exists(path):
+                frames.append(pd.read_json(path, lines=True, dtype=False))
+            day += timedelta(days=1)
+        if not frames:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        alerts = pd.concat(frames, ignore_index=True)
+        return alerts[alerts["时间"] >= since].sort_values("时间", ascending=False, ignore_index=True)
+
+
+# 告警写入进程内队列，供其他消费者（通知、工单等）读取
+class QueueAlertSink:
+    def __init__(self, maxsize=10000):
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def write(self, alerts):
+        for record in alerts.to_dict("records"):
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                break
+
+
+# 监控服务：每个整点拉取一次指标并更新检测器。检测器状态落盘，
+# 多个副本共享同一状态文件，tick 时持有跨进程锁，同一整点只处理一次
+class MonitoringService:
+    def __init__(self, keywords=None, sinks=None, state_path=None, summary_path=None, lock=None, poll_interval=60):
+        self.detector = StreamingDetector(keywords if keywords is not None else tracked_keywords())
+        self.file_sink = JsonlAlertSink()
+        self.sinks = sinks if sinks is not None else [self.file_sink]
+        self.state_path = state_path or STATE_PATH
+        self.summary_path = summary_path or SUMMARY_PATH
+        self.lock = lock or (lambda name: nullcontext())
+        self.poll_interval = poll_interval
+        self.last_tick = None
+        self._state_mtime = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sync_state(self):
+        if os.path.exists(self.state_path):
+            if self.last_tick is None or os.path.getmtime(self.state_path) > self._state_mtime:
+                self.last_tick = self.detector.load(self.state_path) or self.last_tick
+                self._state_mtime = os.path.getmtime(self.state_path)
+
+    # 处理截至 now 的所有未处理整点（首次启动时回放最近 WARM_UP_HOURS 小时）
+    def tick(self, now=None):
+        current_hour = (now or datetime.now()).replace(minute=0, second=0, microsecond=0)
+        with self.lock("monitoring-tick"):
+            self._sync_state()
+            if self.last_tick is None:
+                hour = current_hour - timedelta(hours=WARM_UP_HOURS)
+            else:
+                hour = self.last_tick + timedelta(hours=1)
+            results, summaries = [], []
+            while hour <= current_hour:
+                values = simulate_hourly_metrics(hour, len(self.detector.keywords))
+                alerts = self.detector.update(hour, values)
+                summaries.append(summarize_hour(hour, values, alerts))
+                if hour > current_hour - timedelta(hours=WARM_UP_ALERT_HOURS) and not alerts.empty:
+                    for sink in self.sinks:
+                        sink.write(alerts)
+                    results.append(alerts)
+                self.last_tick = hour
+                hour += timedelta(hours=1)
+            if summaries:
+                self._append_summaries(summaries)
+                self.detector.save(self.state_path, self.last_tick)
+                self._state_mtime = os.path.getmtime(self.state_path)
+        if not results:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        return pd.concat(results, ignore_index=True)
+
+    def _append_summaries(self, summaries):
+        os.makedirs(os.path.dirname(self.summary_path), exist_ok=True)
+        with open(self.summary_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in summaries))
+
+    def recent_alerts(self, hours=24):
+        return self.file_sink.read_recent(hours)
+
+    # 后台线程：单次检测失败（读写错误、锁异常等）只记录日志，下次轮询时从上次处理到的整点继续
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("关键词监控检测失败，%s 秒后重试", self.poll_interval)
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="keyword-monitoring", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+# 实时看板数据源：只读取汇总文件新增的行（按字节偏移增量读取），
+# 进程内所有会话共享同一个滑动窗口；派生结果（图表、KPI）按数据版本缓存，
+# 多个看板同时轮询时每个版本只计算一次，文件每 min_interval 秒最多检查一次
+class LiveFeed:
+    def __init__(self, path=None, window_hours=LIVE_WINDOW_HOURS, min_interval=1.0):
+        self.path = path or SUMMARY_PATH
+        self.window_hours = window_hours
+        self.min_interval = min_interval
+        self.records = deque(maxlen=window_hours)
+        self.version = 0
+        self._offset = None
+        self._checked_at = 0
+        self._frame = None
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def _read_new(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return []
+        if self._offset is None or size < self._offset:
+            # 首次读取或文件被重建：只读末尾窗口，丢弃开头不完整的一行
+            start = max(0, size - self.window_hours * SUMMARY_LINE_BYTES)
+            skip_partial = start > 0
+            self.records.clear()
+        else:
+            start, skip_partial = self._offset, False
+        if size == start:
+            self._offset = start
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(start - 1 if skip_partial else start)
+            data = f.read(size - f.tell())
+        if skip_partial:
+            data = data[data.index(b"\n") + 1:]
+            start = size - len(data)
+        end = data.rfind(b"\n") + 1
+        self._offset = start + end
+        return [json.loads(line) for line in data[:end].decode("utf-8").splitlines() if line]
+
+    # 拉取新增的整点汇总，返回当前数据版本号
+    def poll(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at >= self.min_interval:
+                self._checked_at = now
+                records = self._read_new()
+                if records:
+                    self.records.extend(records)
+                    self.version += 1
+                    self._frame = None
+                    self._derived = {}
+            return self.version
+
+    # 当前窗口的汇总数据（同一整点重复写入时保留最后一条）
+    def frame(self):
+        with self._lock:
+            if self._frame is None:
+                frame = pd.DataFrame(list(self.records))
+                if not frame.empty:
+                    frame["时间"] = pd.to_datetime(frame["时间"])
+                    frame = frame.drop_duplicates("时间", keep="last").sort_values("时间", ignore_index=True)
+                self._frame = frame
+            return self._frame
+
+    # 按数据版本缓存的派生结果：build(frame) 在每个版本只执行一次
+    def derived(self, name, build):
+        version = self.poll()
+        key = (name, version)
+        if key not in self._derived:
+            self._derived[key] = build(self.frame())
+        return self._derived[key]
+
+
+# 实时看板图表：按小时的流量/转化趋势，以及最新整点的排名分布
+def build_live_figures(summary):
+    if summary.empty:
+        return {}
+    latest = summary.iloc[-1]
+    ranking_data = pd.DataFrame({
+        "排名区间": RANK_BUCKETS,
+        "关键词数量": [int(latest[label]) for label in RANK_BUCKETS]
+    })
+    return {
+        "流量趋势": px.line(summary, x="时间", y="流量", title="流量趋势（按小时）"),
+        "转化趋势": px.line(summary, x="时间", y="转化量", title="转化趋势（按小时）"),
+        "排名分布": px.bar(ranking_data, x="排名区间", y="关键词数量",
+                       title=f"排名分布（{latest['时间']:%m-%d %H:%M}）")
+    }
+
+
+# 实时 KPI：最近 hours 小时与之前 hours 小时对比
+def compute_live_kpis(summary, hours=24):
+    def summarize(df):
+        rank_count = df["排名词数"].sum() if not df.empty else 0
+        traffic = df["流量"].sum() if not df.empty else 0.0
+        return {
+            "平均排名": df["排名合计"].sum() / rank_count if rank_count else 0.0,
+            "整体流量": traffic,
+            "转化率": df["转化量"].sum() / traffic if traffic else 0.0
+        }
+
+    if summary.empty:
+        return []
+    return format_kpis(summarize(summary.iloc[-hours:]), summarize(summary.iloc[-2 * hours:-hours]))
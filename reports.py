@@ -0,0 +1,430 @@
+import hashlib
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from config import DATA_DIR
+
+# 日聚合（partial aggregates）存放目录，每天一个 Parquet 文件
+PARTIALS_DIR = os.path.join(DATA_DIR, "partials")
+
+# 报告构建代码的版本（本文件内容的哈希），作为共享缓存中报告命名空间的代码版本，
+# 部署修改后的报告代码时，各副本缓存的旧报告和图表随之失效
+with open(__file__, "rb") as _f:
+    REPORT_CODE_VERSION = hashlib.sha256(_f.read()).hexdigest()[:12]
+
+# 报告维度定义
+SOURCES = ['自然搜索', '付费搜索', '直接访问', '社交媒体', '邮件营销', '其他']
+SOURCE_RANGES = [(4000, 6000), (2000, 4000), (1000, 2000), (500, 1000), (300, 700), (100, 300)]
+LANDING_PAGES = ["首页", "产品详情", "解决方案", "定价页", "文档中心"]
+LANDING_VISITS = np.array([8000, 5000, 3000, 2000, 1500]) / 30
+LANDING_BOUNCE = np.array([0.25, 0.35, 0.4, 0.3, 0.45])
+LANDING_STAY_SECONDS = np.array([150, 225, 110, 135, 260])
+PATH_NODES = ["访问", "搜索", "浏览产品", "加入购物车", "注册", "购买"]
+PATH_LINKS = [(0, 1), (0, 2), (1, 3), (1, 4), (2, 4), (2, 5), (3, 5), (4, 5)]
+PATH_VALUES = np.array([8000, 4000, 3000, 2000, 1500, 1000, 800, 500]) / 30
+FUNNEL_STAGES = ["访问", "点击", "注册", "购买"]
+FUNNEL_VALUES = np.array([10000, 5000, 1000, 200]) / 30
+PRODUCTS = ["ECS云服务器", "OSS对象存储", "RDS云数据库", "CDN", "负载均衡",
+            "云监控", "容器服务", "弹性公网IP", "NAT网关", "SSL证书"]
+CHANNELS = ["自然搜索", "付费搜索", "直接访问", "其他"]
+COMPETITORS = ["阿里云", "腾讯云", "华为云", "火山云"]
+KEYWORD_TYPES = ["产品词", "品牌词", "解决方案词"]
+COMPETE_METRICS = ["搜索排名", "广告投放", "品牌知名度", "产品完整度", "价格优势"]
+WEEKDAYS = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+TRACKED_KEYWORDS = 100
+
+REPORT_TYPES = ["实时监控", "周报", "月报", "竞品分析", "自定义报告"]
+
+
+# 每天固定随机种子，保证同一天的模拟原始数据可重复
+def _day_rng(day):
+    return np.random.default_rng(int(day.strftime("%Y%m%d")))
+
+
+# 模拟某一天的原始数据并聚合为长表：日期 / 指标 / 维度 / 值
+# 所有指标均为可加的计数或合计，比率在出图时再计算，便于任意时间段直接求和
+def compute_daily_partial(day):
+    rng = _day_rng(day)
+    metrics, dims, values = [], [], []
+
+    def add(metric, keys, vals):
+        keys = list(keys)
+        metrics.extend([metric] * len(keys))
+        dims.extend(keys)
+        values.extend(np.asarray(vals, dtype=float).ravel())
+
+    # 流量来源
+    add("流量", SOURCES, [rng.integers(lo, hi) for lo, hi in SOURCE_RANGES])
+
+    # 落地页
+    visits = np.round(LANDING_VISITS * rng.uniform(0.8, 1.2, len(LANDING_PAGES)))
+    add("页面访问", LANDING_PAGES, visits)
+    add("页面跳出", LANDING_PAGES, np.round(visits * LANDING_BOUNCE * rng.uniform(0.9, 1.1, len(LANDING_PAGES))))
+    add("页面停留秒数", LANDING_PAGES, visits * LANDING_STAY_SECONDS * rng.uniform(0.9, 1.1, len(LANDING_PAGES)))
+
+    # 转化路径与漏斗
+    add("转化路径", [f"{s}-{t}" for s, t in PATH_LINKS], np.round(PATH_VALUES * rng.uniform(0.8, 1.2, len(PATH_LINKS))))
+    add("漏斗", FUNNEL_STAGES, np.round(FUNNEL_VALUES * rng.uniform(0.8, 1.2, len(FUNNEL_STAGES))))
+
+    # 产品转化
+    add("销量", PRODUCTS, rng.integers(3, 35, len(PRODUCTS)))
+    add("收入", PRODUCTS, rng.integers(300, 3300, len(PRODUCTS)))
+    add("渠道收入", [f"{p}|{c}" for p in PRODUCTS for c in CHANNELS],
+        rng.integers(30, 330, len(PRODUCTS) * len(CHANNELS)))
+
+    # 竞品
+    brand_types = [f"{b}|{t}" for t in KEYWORD_TYPES for b in COMPETITORS]
+    add("覆盖词数", brand_types, rng.integers(60, 180, len(brand_types)))
+    add("总词数", brand_types, [200] * len(brand_types))
+    add("竞争力得分", [f"{b}|{m}" for b in COMPETITORS for m in COMPETE_METRICS],
+        rng.uniform(60, 100, len(COMPETITORS) * len(COMPETE_METRICS)))
+
+    # 投放
+    spend = rng.uniform(8000, 12000)
+    add("投放花费", [""], [spend])
+    add("投放收入", [""], [spend * rng.uniform(2.5, 3.5)])
+
+    # 时段
+    weekday = WEEKDAYS[day.weekday()]
+    hour_visits = rng.integers(200, 800, 24)
+    add("时段访问", [f"{weekday}|{h}" for h in range(24)], hour_visits)
+    add("时段转化", [f"{weekday}|{h}" for h in range(24)], np.round(hour_visits * rng.uniform(0.01, 0.05, 24)))
+
+    # 排名
+    add("排名合计", [""], [TRACKED_KEYWORDS * rng.uniform(4, 6.5)])
+    add("排名词数", [""], [TRACKED_KEYWORDS])
+
+    return pd.DataFrame({
+        "日期": pd.Timestamp(day),
+        "指标": metrics,
+        "维度": dims,
+        "值": values
+    })
+
+
+def _partial_path(day):
+    return os.path.join(PARTIALS_DIR, f"{day.isoformat()}.parquet")
+
+
+# 计算并落盘某天的日聚合（供进程池调用），当天数据未完整，不落盘
+def compute_and_store_partial(day):
+    partial = compute_daily_partial(day)
+    if day < date.today():
+        os.makedirs(PARTIALS_DIR, exist_ok=True)
+        path = _partial_path(day)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        partial.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return partial
+
+
+# 读取时间段内的日聚合，缺失的天数重新计算（可传入进程池并行计算）
+def load_partials(start, end, executor=None):
+    days = [d.date() for d in pd.date_range(start, end, freq='D')]
+    partials, missing = {}, []
+    for day in days:
+        path = _partial_path(day)
+        if os.path.exists(path):
+            partials[day] = pd.read_parquet(path)
+        else:
+            missing.append(day)
+
+    if executor is not None and len(missing) > 1:
+        computed = executor.map(compute_and_store_partial, missing)
+    else:
+        computed = map(compute_and_store_partial, missing)
+    partials.update(zip(missing, computed))
+
+    if not partials:
+        return compute_daily_partial(start).iloc[0:0]
+    return pd.concat([partials[day] for day in days], ignore_index=True)
+
+
+# 删除时间段内已落盘的日聚合并重新计算（源数据修正后调用）
+def rebuild_partials(start, end, executor=None):
+    for day in pd.date_range(start, end, freq='D'):
+        try:
+            os.remove(_partial_path(day.date()))
+        except FileNotFoundError:
+            pass
+    return load_partials(start, end, executor=executor)
+
+
+# 报告类型对应的时间段
+def report_period(report_type, today=None):
+    today = today or date.today()
+    if report_type == "周报":
+        start = today - timedelta(days=today.weekday() + 7)
+        return start, start + timedelta(days=6)
+    if report_type == "月报":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    if report_type == "竞品分析":
+        return today - timedelta(days=29), today
+    return today - timedelta(days=6), today
+
+
+# 紧邻的上一个时间段，用于计算环比：完整的自然月（月报）对比上一个自然月，其余对比同长度的前一段
+def previous_period(start, end):
+    if start.day == 1 and (end + timedelta(days=1)).day == 1 and (start.year, start.month) == (end.year, end.month):
+        prev_end = start - timedelta(days=1)
+        return prev_end.replace(day=1), prev_end
+    length = end - start + timedelta(days=1)
+    return start - length, end - length
+
+
+# 快照的期间标识，如 2024-W11、2024-03
+def period_key(report_type, start):
+    if report_type == "周报":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    if report_type == "月报":
+        return start.strftime("%Y-%m")
+    return start.isoformat()
+
+
+def _metric(df, name):
+    return df[df["指标"] == name].groupby("维度", sort=False)["值"].sum()
+
+
+def _metric_matrix(df, name, rows, columns):
+    values = _metric(df, name)
+    keys = values.index.str.split("|", expand=True)
+    matrix = pd.Series(values.values, index=keys).unstack()
+    return matrix.reindex(index=rows, columns=columns)
+
+
+def _num_days(df):
+    return max(df["日期"].nunique(), 1)
+
+
+# 核心指标（平均排名、整体流量、转化率）
+def compute_kpis(current, previous):
+    def summarize(df):
+        rank_count = _metric(df, "排名词数").sum()
+        hour_visits = _metric(df, "时段访问").sum()
+        return {
+            "平均排名": _metric(df, "排名合计").sum() / rank_count if rank_count else 0.0,
+            "整体流量": _metric(df, "流量").sum(),
+            "转化率": _metric(df, "时段转化").sum() / hour_visits if hour_visits else 0.0
+        }
+
+    return format_kpis(summarize(current), summarize(previous))
+
+
+# 将本期与上期的指标汇总格式化为 st.metric 的卡片数据
+def format_kpis(cur, prev):
+    traffic_delta = (cur["整体流量"] / prev["整体流量"] - 1) if prev["整体流量"] else 0.0
+    return [
+        {"label": "平均排名", "value": f"{cur['平均排名']:.1f}",
+         "delta": f"{cur['平均排名'] - prev['平均排名']:+.1f}"},
+        {"label": "整体流量", "value": f"{cur['整体流量']:,.0f}",
+         "delta": f"{traffic_delta:+.0%}"},
+        {"label": "转化率", "value": f"{cur['转化率']:.1%}",
+         "delta": f"{cur['转化率'] - prev['转化率']:+.1%}"}
+    ]
+
+
+# 根据时间段的日聚合构建报告中的全部图表
+def build_report_figures(df):
+    figures = {}
+    days = _num_days(df)
+
+    # 流量来源分布
+    source_data = df[df["指标"] == "流量"].rename(columns={"维度": "来源", "值": "流量"})
+    fig = px.bar(source_data,
+                 x='日期',
+                 y='流量',
+                 color='来源',
+                 title='流量来源分布趋势',
+                 color_discrete_sequence=px.colors.qualitative.Set3)
+    fig.update_layout(
+        barmode='relative',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        yaxis_title='流量占比',
+        xaxis_title='日期',
+        legend_title='流量来源',
+        title_x=0.5
+    )
+    figures["流量来源分布"] = fig
+
+    # 页面访问量与跳出率
+    visits = _metric(df, "页面访问").reindex(LANDING_PAGES)
+    bounce_rate = (_metric(df, "页面跳出").reindex(LANDING_PAGES) / visits).round(3)
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(
+        go.Bar(
+            name="访问量",
+            x=LANDING_PAGES,
+            y=visits.values,
+            marker_color='rgb(158,202,225)'
+        ),
+        secondary_y=False
+    )
+    fig.add_trace(
+        go.Scatter(
+            name="跳出率",
+            x=LANDING_PAGES,
+            y=bounce_rate.values,
+            mode='lines+markers',
+            marker_color='rgb(94,94,94)',
+            line=dict(color='rgb(94,94,94)')
+        ),
+        secondary_y=True
+    )
+    fig.update_layout(
+        title="页面访问量与跳出率",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        title_x=0.5
+    )
+    fig.update_yaxes(title_text="访问量", secondary_y=False)
+    fig.update_yaxes(title_text="跳出率", secondary_y=True)
+    figures["页面访问量与跳出率"] = fig
+
+    # 页面平均停留时间
+    time_in_seconds = (_metric(df, "页面停留秒数").reindex(LANDING_PAGES) / visits).round().astype(int)
+    fig = go.Figure(data=[
+        go.Bar(
+            name="平均停留时间",
+            x=LANDING_PAGES,
+            y=time_in_seconds.values,
+            text=[f"{t // 60}:{t % 60:02d}" for t in time_in_seconds],
+            textposition='auto',
+            marker_color='rgb(142,202,230)'
+        )
+    ])
+    fig.update_layout(
+        title="页面平均停留时间",
+        yaxis_title="时间（秒）",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        title_x=0.5
+    )
+    figures["页面平均停留时间"] = fig
+
+    # 用户转化路径（桑基图）
+    path_values = _metric(df, "转化路径").reindex([f"{s}-{t}" for s, t in PATH_LINKS])
+    fig = go.Figure(data=[go.Sankey(
+        node=dict(
+            pad=15,
+            thickness=20,
+            line=dict(color="rgba(0,0,0,0)", width=0.5),
+            label=PATH_NODES,
+            color=["#FFB6C1", "#87CEEB", "#98FB98", "#DDA0DD", "#F0E68C", "#E6E6FA"]  # 柔和的配色方案
+        ),
+        link=dict(
+            source=[s for s, _ in PATH_LINKS],
+            target=[t for _, t in PATH_LINKS],
+            value=path_values.values,
+            color=["rgba(255,182,193,0.3)", "rgba(135,206,235,0.3)",
+                   "rgba(152,251,152,0.3)", "rgba(221,160,221,0.3)",
+                   "rgba(240,230,140,0.3)", "rgba(230,230,250,0.3)",
+                   "rgba(255,182,193,0.3)", "rgba(135,206,235,0.3)"]  # 半透明的连接颜色
+        )
+    )])
+    fig.update_layout(
+        title_text="用户转化路径分析",
+        font_size=12,
+        height=400,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        title_x=0.5
+    )
+    figures["用户转化路径"] = fig
+
+    # 整体转化漏斗
+    funnel = _metric(df, "漏斗").reindex(FUNNEL_STAGES)
+    figures["整体转化漏斗"] = go.Figure(go.Funnel(y=FUNNEL_STAGES, x=funnel.values))
+
+    # 产品销量分布
+    product_data = pd.DataFrame({
+        "产品": PRODUCTS,
+        "销量": _metric(df, "销量").reindex(PRODUCTS).astype(int).values
+    })
+    fig = px.bar(product_data, x="产品", y="销量",
+                 text=product_data["销量"].apply(str),
+                 title="各产品销量分布")
+    fig.update_layout(xaxis_tickangle=45)
+    figures["各产品销量分布"] = fig
+
+    # 产品-渠道收入热力图
+    product_channel = _metric_matrix(df, "渠道收入", PRODUCTS, CHANNELS)
+    figures["产品-渠道收入分布"] = px.imshow(product_channel,
+                                       title="产品-渠道收入分布",
+                                       aspect="auto")
+
+    # 关键词覆盖率对比
+    coverage = (_metric(df, "覆盖词数") / _metric(df, "总词数")).reset_index()
+    coverage[["品牌", "关键词类型"]] = coverage["维度"].str.split("|", expand=True)
+    coverage = coverage.rename(columns={"值": "覆盖率"})
+    figures["关键词覆盖率对比"] = px.bar(coverage, x="品牌", y="覆盖率", color="关键词类型",
+                                   barmode="group", title="关键词覆盖率对比")
+
+    # 竞争力雷达图
+    radar_data = (_metric(df, "竞争力得分") / days).reset_index()
+    radar_data[["品牌", "指标"]] = radar_data["维度"].str.split("|", expand=True)
+    radar_data = radar_data.rename(columns={"值": "得分"})
+    figures["竞争力雷达图"] = px.line_polar(radar_data, r="得分", theta="指标", color="品牌",
+                                       line_close=True, title="竞争力雷达图")
+
+    # ROI趋势
+    daily = df[df["指标"].isin(["投放花费", "投放收入"])].pivot_table(
+        index="日期", columns="指标", values="值", aggfunc="sum"
+    )
+    roi_data = pd.DataFrame({
+        '日期': daily.index,
+        'ROI': (daily["投放收入"] / daily["投放花费"]).values
+    })
+    figures["ROI趋势分析"] = px.line(roi_data, x='日期', y='ROI', title='ROI趋势分析')
+
+    # 长尾词vs核心词对比
+    keyword_type_data = pd.DataFrame({
+        '指标': ['展现量', '点击率', '转化率', '获客成本'],
+        '长尾词': [15000, 0.035, 0.028, 35],
+        '核心词': [50000, 0.025, 0.018, 55]
+    })
+    fig = go.Figure(data=[
+        go.Bar(name='长尾词', x=keyword_type_data['指标'], y=keyword_type_data['长尾词']),
+        go.Bar(name='核心词', x=keyword_type_data['指标'], y=keyword_type_data['核心词'])
+    ])
+    fig.update_layout(title='长尾词vs核心词效果对比', barmode='group')
+    figures["长尾词vs核心词效果对比"] = fig
+
+    # 时段转化率热力图
+    hours = list(range(24))
+    hour_visits = _metric_matrix(df, "时段访问", WEEKDAYS, [str(h) for h in hours])
+    hour_conversions = _metric_matrix(df, "时段转化", WEEKDAYS, [str(h) for h in hours])
+    conversion_matrix = (hour_conversions / hour_visits).values
+    figures["时段转化率分布"] = px.imshow(conversion_matrix,
+                                     labels=dict(x="小时", y="星期", color="转化率"),
+                                     x=hours,
+                                     y=WEEKDAYS,
+                                     title="时段转化率分布")
+
+    return figures
+
+
+# 从日聚合实时构建报告（实时监控、竞品分析、自定义报告，以及快照未生成时的兜底）
+def build_report(start, end, executor=None):
+    prev_start, prev_end = previous_period(start, end)
+    partials = load_partials(prev_start, end, executor=executor)
+    current = partials[partials["日期"] >= pd.Timestamp(start)]
+    previous = partials[partials["日期"] < pd.Timestamp(start)]
+    return {
+        "data": current.reset_index(drop=True),
+        "figures": build_report_figures(current),
+        "meta": {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "kpis": compute_kpis(current, previous),
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+    }
@@ -0,0 +1,297 @@
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import date, datetime
+
+import pandas as pd
+import plotly.io as pio
+
+from config import DATA_DIR
+from reports import REPORT_CODE_VERSION, build_report, period_key, rebuild_partials, report_period
+
+logger = logging.getLogger(__name__)
+
+# 报告快照存放目录：snapshots/<报告类型>/<期间>/v<版本号>/
+SNAPSHOTS_DIR = os.path.join(DATA_DIR, "snapshots")
+
+# 包含今天的实时报告在共享缓存中的有效期（秒）
+LIVE_REPORT_TTL = 300
+
+# 默认调度：周报每周一 02:00，月报每月 1 日 03:00
+DEFAULT_SCHEDULES = {
+    "周报": "0 2 * * 1",
+    "月报": "0 3 1 * *"
+}
+
+
+# 简化版 cron 表达式：分 时 日 月 周，支持 *、*/n、a-b、a,b。
+# 与标准 cron 一致：日和周都被限定（不以 * 开头）时，满足其中之一即可
+class CronSchedule:
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 表达式需要 5 个字段: '{expr}'")
+        self.expr = expr
+        self.fields = [self._parse(field, lo, hi) for field, (lo, hi) in zip(fields, self.RANGES)]
+        self.day_or_weekday = not fields[2].startswith("*") and not fields[4].startswith("*")
+        # 周字段中 0 和 7 都表示周日
+        if 7 in self.fields[4]:
+            self.fields[4].add(0)
+
+    @staticmethod
+    def _parse(field, lo, hi):
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/")
+                step = int(step)
+            if part == "*":
+                start, end = lo, hi
+            elif "-" in part:
+                start, end = (int(x) for x in part.split("-"))
+            else:
+                start = end = int(part)
+            if start < lo or end > hi or step < 1:
+                raise ValueError(f"cron 字段超出范围: '{field}'")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def matches(self, dt):
+        minute, hour, day, month, weekday = self.fields
+        day_matches = dt.day in day
+        weekday_matches = (dt.weekday() + 1) % 7 in weekday
+        return (
+            dt.minute in minute
+            and dt.hour in hour
+            and dt.month in month
+            and (day_matches or weekday_matches if self.day_or_weekday else day_matches and weekday_matches)
+        )
+
+
+# 版本化的报告快照：data.parquet（期间日聚合）+ figures.json（序列化图表）+ meta.json
+class SnapshotStore:
+    def __init__(self, root=None):
+        self.root = root or SNAPSHOTS_DIR
+
+    def _period_dir(self, report_type, key):
+        return os.path.join(self.root, report_type, key)
+
+    def versions(self, report_type, key):
+        period_dir = self._period_dir(report_type, key)
+        if not os.path.isdir(period_dir):
+            return []
+        return sorted(
+            int(name[1:]) for name in os.listdir(period_dir)
+            if name.startswith("v") and name[1:].isdigit()
+        )
+
+    def save(self, report_type, key, report):
+        period_dir = self._period_dir(report_type, key)
+        os.makedirs(period_dir, exist_ok=True)
+
+        # 先写临时目录，再原子重命名为新版本，读取方不会看到写了一半的快照
+        tmp_dir = os.path.join(period_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            report["data"].to_parquet(os.path.join(tmp_dir, "data.parquet"), index=False)
+            with open(os.path.join(tmp_dir, "figures.json"), "w", encoding="utf-8") as f:
+                json.dump({name: pio.to_json(fig) for name, fig in report["figures"].items()}, f)
+            while True:
+                version = (self.versions(report_type, key) or [0])[-1] + 1
+                meta = dict(report["meta"], report_type=report_type, period=key, version=version)
+                with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                    json.dump(meta, f, ensure_ascii=False, indent=2)
+                try:
+                    os.rename(tmp_dir, os.path.join(period_dir, f"v{version}"))
+                    return version
+                except OSError:
+                    # 并发写入抢占了同一版本号，重试下一个
+                    if not os.path.isdir(os.path.join(period_dir, f"v{version}")):
+                        raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def meta(self, report_type, key, version):
+        version_dir = os.path.join(self._period_dir(report_type, key), f"v{version}")
+        with open(os.path.join(version_dir, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def load(self, report_type, key, version):
+        version_dir = os.path.join(self._period_dir(report_type, key), f"v{version}")
+        meta = self.meta(report_type, key, version)
+        with open(os.path.join(version_dir, "figures.json"), encoding="utf-8") as f:
+            figures = {name: pio.from_json(fig) for name, fig in json.load(f).items()}
+        return {
+            "data": pd.read_parquet(os.path.join(version_dir, "data.parquet")),
+            "figures": figures,
+            "meta": meta
+        }
+
+    def load_latest(self, report_type, key):
+        versions = self.versions(report_type, key)
+        if not versions:
+            return None
+        return self.load(report_type, key, versions[-1])
+
+
+# 本地报告调度器：按 cron 表达式在后台线程中预计算周报/月报快照，
+# 日聚合的计算分发到进程池。传入共享缓存时，多个副本通过缓存后端的跨进程锁
+# 协调，同一期间的同一次调度只由一个副本计算
+class ReportScheduler:
+    def __init__(self, store=None, schedules=None, max_workers=None, poll_interval=20, cache=None):
+        self.store = store or SnapshotStore()
+        self.cache = cache
+        if cache is not None:
+            cache.set_code_version("report", REPORT_CODE_VERSION)
+        self.schedules = {
+            report_type: CronSchedule(expr)
+            for report_type, expr in (schedules or DEFAULT_SCHEDULES).items()
+        }
+        self.max_workers = max_workers or os.cpu_count()
+        self.poll_interval = poll_interval
+        self._last_run = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _lock_for(self, name):
+        if self.cache is None:
+            return nullcontext()
+        return self.cache.backend.lock(name)
+
+    # 计算并保存快照，返回最新版本号。持有“报告类型+期间”的锁后重新检查已有版本：
+    # scheduled_at 为空（补算）时已有任意版本即跳过，否则已有同一调度时刻生成的版本即跳过，
+    # 其他副本等锁期间已完成的计算不会重复执行
+    def materialize(self, report_type, today=None, scheduled_at=None):
+        start, end = report_period(report_type, today)
+        key = period_key(report_type, start)
+        with self._lock, self._lock_for(f"materialize:{report_type}:{key}"):
+            versions = self.store.versions(report_type, key)
+            if versions and (
+                scheduled_at is None
+                or self.store.meta(report_type, key, versions[-1]).get("scheduled_at") == scheduled_at.isoformat()
+            ):
+                return versions[-1]
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                report = build_report(start, end, executor=pool)
+            report["meta"]["scheduled_at"] = scheduled_at.isoformat() if scheduled_at else None
+            return self.store.save(report_type, key, report)
+
+    # 当前期间尚无快照时立即补算（首次启动或错过调度时间）
+    def ensure_current(self, today=None):
+        for report_type in self.schedules:
+            start, _ = report_period(report_type, today)
+            if not self.store.versions(report_type, period_key(report_type, start)):
+                self.materialize(report_type, today)
+
+    # 执行到期的调度；失败的调度保留在待执行列表中，下次轮询时重试，不会因错过调度分钟而丢失
+    def run_pending(self, now=None):
+        now = (now or datetime.now()).replace(second=0, microsecond=0)
+        for report_type, schedule in self.schedules.items():
+            if schedule.matches(now) and self._last_run.get(report_type) != now:
+                self._last_run[report_type] = now
+                self._pending[report_type] = now
+        for report_type, scheduled_at in list(self._pending.items()):
+            self.materialize(report_type, scheduled_at.date(), scheduled_at=scheduled_at)
+            del self._pending[report_type]
+
+    # 后台线程：单次补算或调度失败（读写错误、锁异常等）只记录日志，继续轮询，线程不会因此退出
+    def _loop(self):
+        caught_up = False
+        while not self._stop.is_set():
+            try:
+                if not caught_up:
+                    self.ensure_current()
+                    caught_up = True
+                self.run_pending()
+            except Exception:
+                logger.exception("报告调度失败，%s 秒后重试", self.poll_interval)
+            self._stop.wait(self.poll_interval)
+
+    # 重新计算时间段内的日聚合（源数据修正后调用），并使所有副本缓存的实时报告失效；
+    # 已生成的快照保持不变，需要时重新物化对应期间
+    def rebuild_partials(self, start, end):
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            rebuild_partials(start, end, executor=pool)
+        if self.cache is not None:
+            self.cache.invalidate("report")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="report-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _cached(self, namespace, parts, compute, ttl=None):
+        if self.cache is None:
+            return compute()
+        return self.cache.get_or_compute(namespace, parts, compute, ttl=ttl)
+
+    # 读取报告：周报/月报优先读取快照，其余类型或快照缺失时从日聚合实时构建
+    def get_report(self, report_type, today=None):
+        start, end = report_period(report_type, today)
+        if report_type in self.schedules:
+            key = period_key(report_type, start)
+            versions = self.store.versions(report_type, key)
+            if versions:
+                return self._cached(
+                    "snapshot", [report_type, key, versions[-1]],
+                    lambda: self.store.load(report_type, key, versions[-1])
+                )
+        return self.get_range_report(start, end)
+
+    # 按时间段实时构建报告，包含今天的报告数据仍在变化，只缓存较短时间
+    def get_range_report(self, start, end):
+        ttl = LIVE_REPORT_TTL if end >= date.today() else None
+        return self._cached("report", [start, end], lambda: build_report(start, end), ttl=ttl)
+
+
+if __name__ == '__main__':
+    # 独立进程运行调度器：python scheduler.py（与应用副本共用缓存后端的锁，不会重复生成快照）；
+    # 源数据修正后重新计算日聚合：python scheduler.py rebuild-partials 2024-03-01 2024-03-31
+    import argparse
+
+    from cache import create_shared_cache
+
+    parser = argparse.ArgumentParser(description="报告调度器")
+    subparsers = parser.add_subparsers(dest="command")
+    rebuild_parser = subparsers.add_parser("rebuild-partials", help="重新计算日聚合并使缓存的报告失效")
+    rebuild_parser.add_argument("start", type=date.fromisoformat)
+    rebuild_parser.add_argument("end", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    scheduler = ReportScheduler(cache=create_shared_cache())
+    if args.command == "rebuild-partials":
+        scheduler.rebuild_partials(args.start, args.end)
+        print(f"已重新计算 {args.start} 至 {args.end} 的日聚合")
+    else:
+        scheduler.start()
+        print(f"报告调度器已启动，快照目录: {scheduler.store.root}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
@@ -0,0 +1,340 @@
+import json
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from library_history import HISTORY_DIR, KEY_COLUMN
+
+# 标签规则与手动标签与词库历史存放在一起，手动标签按行 ID 记录
+TAGS_DIR = os.path.join(HISTORY_DIR, "tags")
+TAG_INDEX_CACHE_SIZE = 4
+
+RULE_TYPES = ["前缀", "正则", "词典"]
+
+# 默认标签规则：产品线、关键词类型；活动标签可在“标签管理”中自行添加
+DEFAULT_TAG_RULES = [
+    {"标签": "产品线:ECS", "类型": "正则", "规则": "云服务器|ecs|服务器"},
+    {"标签": "产品线:数据库", "类型": "正则", "规则": "数据库|rds|mysql|redis"},
+    {"标签": "产品线:存储", "类型": "词典", "规则": "对象存储,oss,存储,nas"},
+    {"标签": "产品线:网络", "类型": "词典", "规则": "负载均衡,slb,cdn,nat,公网ip"},
+    {"标签": "品牌词", "类型": "前缀", "规则": "阿里云,aliyun"},
+    {"标签": "产品词", "类型": "词典", "规则": "云服务器,云数据库,对象存储,负载均衡,cdn,ecs,oss,rds"},
+    {"标签": "解决方案词", "类型": "正则", "规则": "方案|解决|架构|迁移|部署|上云"}
+]
+
+
+# 位图工具：每个关键词占 1 位（np.packbits），百万级词库每个标签约 125KB，
+# 与/或/非查询直接在压缩后的字节数组上按位运算
+def _empty(size):
+    return np.zeros((size + 7) // 8, dtype=np.uint8)
+
+
+def _pack(mask):
+    return np.packbits(np.asarray(mask, dtype=bool))
+
+
+def _unpack(bits, size):
+    return np.unpackbits(bits, count=size).astype(bool)
+
+
+def _resize(bits, size):
+    nbytes = (size + 7) // 8
+    if len(bits) >= nbytes:
+        return bits[:nbytes].copy()
+    return np.concatenate([bits, np.zeros(nbytes - len(bits), dtype=np.uint8)])
+
+
+def _assign_bits(bits, positions, values):
+    positions = np.asarray(positions, dtype=np.int64)
+    values = np.asarray(values, dtype=bool)
+    masks = (0x80 >> (positions & 7)).astype(np.uint8)
+    np.bitwise_and.at(bits, positions >> 3, ~masks)
+    np.bitwise_or.at(bits, positions[values] >> 3, masks[values])
+
+
+def _rule_key(rule):
+    return rule["标签"], rule["类型"], rule["规则"]
+
+
+# 规则集变化时受影响的标签（新增或删除了规则的标签）
+def _affected_tags(old_rules, new_rules):
+    old_keys = {_rule_key(rule) for rule in old_rules}
+    new_keys = {_rule_key(rule) for rule in new_rules}
+    return sorted({key[0] for key in old_keys ^ new_keys})
+
+
+def _terms(pattern):
+    return [t.strip().lower() for t in re.split(r"[,，\n]", pattern) if t.strip()]
+
+
+# 对一组关键词向量化地执行一条规则，返回布尔数组（不区分大小写）
+def evaluate_rule(rule, keywords):
+    keywords = keywords.astype(str).str.lower()
+    if rule["类型"] == "前缀":
+        return keywords.str.startswith(tuple(_terms(rule["规则"]))).to_numpy()
+    if rule["类型"] == "词典":
+        pattern = "|".join(re.escape(t) for t in _terms(rule["规则"]))
+    elif rule["类型"] == "正则":
+        pattern = rule["规则"]
+    else:
+        raise ValueError(f"未知的规则类型: '{rule['类型']}'")
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"规则 '{rule['规则']}' 不是有效的正则表达式: {e}")
+    if not pattern:
+        return np.zeros(len(keywords), dtype=bool)
+    return keywords.str.contains(pattern, case=False, regex=True).to_numpy()
+
+
+# 标签倒排索引：标签 -> 关键词位图（按词库行号）。
+# 每条规则单独缓存命中位图，规则变化时只对新增规则做字符串匹配，
+# 删除规则只需对剩余规则的位图重新求或；新增/修改关键词只对这些行执行规则
+class TagIndex:
+    def __init__(self, rules=None):
+        self.size = 0
+        self.rules = [dict(rule) for rule in (rules if rules is not None else DEFAULT_TAG_RULES)]
+        self.rule_bitmaps = {}
+        self.manual = {}
+        self.bitmaps = {}
+        self._labels = None
+
+    def _refresh_tags(self, tags):
+        self._labels = None
+        for tag in tags:
+            bits = self.manual.get(tag, _empty(self.size)).copy()
+            for rule in self.rules:
+                if rule["标签"] == tag:
+                    bits |= self.rule_bitmaps[_rule_key(rule)]
+            self.bitmaps[tag] = bits
+
+    # 对整个词库执行全部规则
+    def build(self, keywords):
+        self.size = len(keywords)
+        self.manual = {tag: _resize(bits, self.size) for tag, bits in self.manual.items()}
+        self.rule_bitmaps = {_rule_key(rule): _pack(evaluate_rule(rule, keywords)) for rule in self.rules}
+        self.bitmaps = {}
+        self._refresh_tags(self.tags())
+        return self
+
+    # 更新规则集，返回受影响的标签
+    def update_rules(self, rules, keywords):
+        rules = [dict(rule) for rule in rules]
+        new_keys = {_rule_key(rule) for rule in rules}
+        old_keys = {_rule_key(rule) for rule in self.rules}
+        added = [rule for rule in rules if _rule_key(rule) not in old_keys]
+        # 先校验全部新规则，出错时不修改现有索引
+        added_bitmaps = {_rule_key(rule): _pack(evaluate_rule(rule, keywords)) for rule in added}
+        affected = _affected_tags(self.rules, rules)
+        for key in old_keys - new_keys:
+            del self.rule_bitmaps[key]
+        self.rule_bitmaps.update(added_bitmaps)
+        self.rules = rules
+        for tag in affected:
+            self.bitmaps.pop(tag, None)
+        self._refresh_tags(tag for tag in affected if tag in self.tags())
+        return affected
+
+    # 对指定行（新增或修改的关键词）重新执行规则
+    def retag_rows(self, keywords, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) == 0:
+            return
+        size = max(self.size, int(positions.max()) + 1)
+        if size != self.size:
+            self.size = size
+            self.rule_bitmaps = {key: _resize(bits, size) for key, bits in self.rule_bitmaps.items()}
+            self.manual = {tag: _resize(bits, size) for tag, bits in self.manual.items()}
+        rows = keywords.iloc[positions]
+        for rule in self.rules:
+            _assign_bits(self.rule_bitmaps[_rule_key(rule)], positions, evaluate_rule(rule, rows))
+        self._refresh_tags(self.tags())
+
+    def append(self, keywords, count=1):
+        self.retag_rows(keywords, np.arange(len(keywords) - count, len(keywords)))
+
+    def set_manual(self, tag, positions, value=True):
+        if not value and tag not in self.manual:
+            return
+        bits = self.manual.setdefault(tag, _empty(self.size))
+        _assign_bits(bits, positions, np.full(len(positions), value))
+        self._refresh_tags([tag])
+
+    # 按 ID 重新设置全部手动标签：manual 为 {标签: ID 数组}，ids 为各行的 ID
+    def set_manual_ids(self, manual, ids):
+        for tag in set(self.manual) - set(manual):
+            self.bitmaps.pop(tag, None)
+        self.manual = {tag: _pack(np.isin(ids, tag_ids)) for tag, tag_ids in manual.items()}
+        self._refresh_tags(self.tags())
+
+    def copy(self):
+        index = TagIndex(self.rules)
+        index.size = self.size
+        index.rule_bitmaps = {key: bits.copy() for key, bits in self.rule_bitmaps.items()}
+        index.manual = {tag: bits.copy() for tag, bits in self.manual.items()}
+        index.bitmaps = {tag: bits.copy() for tag, bits in self.bitmaps.items()}
+        return index
+
+    def tags(self):
+        return sorted({rule["标签"] for rule in self.rules} | set(self.manual))
+
+    def count(self, tag):
+        return int(np.unpackbits(self.bitmaps.get(tag, _empty(self.size)), count=self.size).sum())
+
+    # 布尔标签查询：同时包含 all_of 中全部标签、至少包含 any_of 中一个标签、不包含 none_of 中任何标签
+    def query(self, all_of=(), any_of=(), none_of=()):
+        bits = np.full((self.size + 7) // 8, 0xFF, dtype=np.uint8)
+        for tag in all_of:
+            bits &= self.bitmaps.get(tag, _empty(self.size))
+        if any_of:
+            union = _empty(self.size)
+            for tag in any_of:
+                union |= self.bitmaps.get(tag, _empty(self.size))
+            bits &= union
+        for tag in none_of:
+            bits &= ~self.bitmaps.get(tag, _empty(self.size))
+        return _unpack(bits, self.size)
+
+    # 全部行的标签文本（用于表格展示），按行号排列，首次计算后缓存在实例上。
+    # 每行的标签组合编码为字节串，对不同的组合各拼接一次文本再按行展开，全程向量化
+    def labels(self):
+        if self._labels is None:
+            tags = self.tags()
+            if not tags or self.size == 0:
+                self._labels = np.full(self.size, "", dtype=object)
+                return self._labels
+            matrix = np.stack([_unpack(self.bitmaps[tag], self.size) for tag in tags], axis=1)
+            codes = np.packbits(matrix, axis=1)
+            rows = np.ascontiguousarray(codes).view(np.dtype((np.void, codes.shape[1])))[:, 0]
+            combos, inverse = np.unique(rows, return_inverse=True)
+            texts = np.array([
+                ", ".join(tags[i] for i in np.flatnonzero(np.unpackbits(np.frombuffer(combo, dtype=np.uint8), count=len(tags))))
+                for combo in combos.tolist()
+            ], dtype=object)
+            self._labels = texts[inverse.reshape(-1)]
+        return self._labels
+
+    # 指定行的标签列表
+    def tags_of(self, positions):
+        return self.labels()[np.asarray(positions, dtype=np.int64)].tolist()
+
+
+# 标签规则与手动标签的持久化：tags.json 记录版本号、规则和手动标签文件，
+# 手动标签为 (标签, ID) 两列的 Parquet 文件，每次修改写新文件后替换 tags.json。
+# 修改在跨进程锁内读取-修改-写入，多个会话同时打标不会互相覆盖
+class TagStore:
+    def __init__(self, root=None, lock=None):
+        self.root = root or TAGS_DIR
+        self.lock = lock or (lambda name: nullcontext())
+
+    def _state_path(self):
+        return os.path.join(self.root, "tags.json")
+
+    def _read_state(self):
+        try:
+            with open(self._state_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 0, "rules": DEFAULT_TAG_RULES, "manual": None}
+
+    def _write_state(self, state):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._state_path()
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _read_manual(self, state):
+        if not state["manual"]:
+            return pd.DataFrame({"标签": pd.Series(dtype=object), KEY_COLUMN: pd.Series(dtype=np.int64)})
+        return pd.read_parquet(os.path.join(self.root, state["manual"]))
+
+    # 当前版本号、规则列表和手动标签 {标签: ID 数组}
+    def load(self):
+        with self.lock("library-tags"):
+            state = self._read_state()
+            manual = self._read_manual(state)
+        return state["version"], state["rules"], {
+            tag: group[KEY_COLUMN].to_numpy() for tag, group in manual.groupby("标签", sort=False)
+        }
+
+    # 保存新的规则集（先校验全部规则），返回受影响的标签
+    def update_rules(self, rules):
+        rules = [dict(rule) for rule in rules]
+        for rule in rules:
+            evaluate_rule(rule, pd.Series([], dtype=object))
+        with self.lock("library-tags"):
+            state = self._read_state()
+            affected = _affected_tags(state["rules"], rules)
+            state["version"] += 1
+            state["rules"] = rules
+            self._write_state(state)
+        return affected
+
+    # 为指定 ID 的关键词添加或移除手动标签
+    def set_manual(self, tag, ids, value=True):
+        ids = np.asarray(ids, dtype=np.int64)
+        with self.lock("library-tags"):
+            state = self._read_state()
+            manual = self._read_manual(state)
+            manual = manual[~((manual["标签"] == tag) & manual[KEY_COLUMN].isin(ids))]
+            if value:
+                manual = pd.concat([manual, pd.DataFrame({"标签": tag, KEY_COLUMN: ids})], ignore_index=True)
+            os.makedirs(self.root, exist_ok=True)
+            relative_path = f"manual-{uuid.uuid4().hex[:8]}.parquet"
+            manual.to_parquet(os.path.join(self.root, relative_path), index=False)
+            previous = state["manual"]
+            state["version"] += 1
+            state["manual"] = relative_path
+            self._write_state(state)
+            if previous:
+                os.remove(os.path.join(self.root, previous))
+
+
+# 按 (词库版本, 标签版本) 缓存的标签索引，在进程内所有会话间共享，取出的索引只读。
+# 同一词库版本只改了规则时复制后只重算变化的规则；词库只追加了关键词时复制后只对新增行执行规则；
+# 手动标签每次按 ID 重新设置
+class TagIndexCache:
+    def __init__(self, max_entries=TAG_INDEX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, library_version, keywords_df, tags_version, rules, manual):
+        key = (library_version, tags_version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][1]
+            keywords = keywords_df["关键词"].tolist()
+            index = None
+            for (cached_version, _), (_, cached_index) in reversed(self._entries.items()):
+                if cached_version == library_version:
+                    index = cached_index.copy()
+                    break
+            if index is None:
+                for cached_keywords, cached_index in reversed(self._entries.values()):
+                    n = len(cached_keywords)
+                    if n <= len(keywords) and keywords[:n] == cached_keywords:
+                        index = cached_index.copy()
+                        index.append(keywords_df["关键词"], len(keywords) - n)
+                        break
+            if index is None:
+                index = TagIndex(rules).build(keywords_df["关键词"])
+            index.update_rules(rules, keywords_df["关键词"])
+            index.set_manual_ids(manual, keywords_df[KEY_COLUMN].to_numpy())
+            self._entries[key] = (keywords, index)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return index
+
+
+def rules_frame(tag_index):
+    return pd.DataFrame(tag_index.rules, columns=["标签", "类型", "规则"])
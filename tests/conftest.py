@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# 测试使用临时数据目录，需在导入 config 之前设置
+os.environ.setdefault("SEO_DATA_DIR", tempfile.mkdtemp(prefix="seo-test-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from cache import DiskBackend, LockTimeout, RedisBackend, SharedCache
+
+
+def test_disk_lock_is_exclusive(tmp_path):
+    backend = DiskBackend(root=str(tmp_path))
+    counter = tmp_path / "counter"
+    counter.write_text("0")
+
+    def work():
+        for _ in range(10):
+            with backend.lock("counter"):
+                value = int(counter.read_text())
+                time.sleep(0.001)
+                counter.write_text(str(value + 1))
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.read_text() == "30"
+
+
+def test_disk_lock_timeout_and_release(tmp_path):
+    backend = DiskBackend(root=str(tmp_path))
+    with backend.lock("report"):
+        with pytest.raises(LockTimeout):
+            with backend.lock("report", timeout=0.2):
+                pass
+    with backend.lock("report", timeout=0.2):
+        pass
+
+
+# 持有锁的进程崩溃后锁由系统释放，其他进程立即可以获取
+def test_disk_lock_released_when_holder_dies(tmp_path):
+    code = (
+        "import os, sys; sys.path.insert(0, sys.argv[1]); from cache import DiskBackend\n"
+        "lock = DiskBackend(root=sys.argv[2]).lock('report'); lock.__enter__(); print('held', flush=True); os._exit(1)"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code, root, str(tmp_path)], capture_output=True, text=True)
+    assert result.stdout.strip() == "held"
+    with DiskBackend(root=str(tmp_path)).lock("report", timeout=0.2):
+        pass
+
+
+# 持有时间超过 stale_after 时由心跳线程续期，锁不会过期被其他客户端取得
+def test_redis_lock_renewed_while_held():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    backend = RedisBackend(fakeredis.FakeStrictRedis(server=server))
+    other = RedisBackend(fakeredis.FakeStrictRedis(server=server))
+    with backend.lock("materialize", stale_after=0.6):
+        time.sleep(1)
+        with pytest.raises(LockTimeout):
+            with other.lock("materialize", timeout=0.3, stale_after=0.6):
+                pass
+    with other.lock("materialize", timeout=0.3, stale_after=0.6):
+        pass
+
+
+def test_namespace_invalidation_across_replicas(tmp_path, monkeypatch):
+    monkeypatch.setattr("cache.NAMESPACE_VERSION_TTL", 0)
+    replica_a = SharedCache(DiskBackend(root=str(tmp_path)))
+    replica_b = SharedCache(DiskBackend(root=str(tmp_path)))
+    replica_a.set("report", ["2024-03"], "旧报告")
+    replica_a.set("snapshot", ["2024-03"], "快照")
+    assert replica_b.get("report", ["2024-03"]) == "旧报告"
+
+    replica_b.invalidate("report")
+    assert replica_a.get("report", ["2024-03"]) is None
+    assert replica_a.get("snapshot", ["2024-03"]) == "快照"
+
+    # 代码版本变化（部署了新的报告代码）后旧条目不再命中
+    replica_a.set("report", ["2024-03"], "新报告")
+    replica_b.set_code_version("report", "next")
+    assert replica_b.get("report", ["2024-03"]) is None
+    assert replica_a.get("report", ["2024-03"]) == "新报告"
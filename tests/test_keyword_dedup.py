@@ -0,0 +1,83 @@
+import time
+
+import pandas as pd
+import pytest
+
+from keyword_dedup import MAX_BUCKET_SIZE, KeywordIndex, KeywordIndexCache, merge_keywords, normalize_keyword
+
+
+@pytest.mark.parametrize("keyword, expected", [
+    ("ＡＬＩＹＵＮ　ＥＣＳ", "aliyun ecs"),
+    ("阿里云 服务器", "阿里云服务器"),
+    ("阿里云-服务器 价格？", "阿里云服务器价格"),
+    ("C++ 教程", "c++教程"),
+    ("c# 入门", "c#入门"),
+    ("Node.JS 入门", "node.js入门"),
+    (".NET 框架", ".net框架"),
+    ("云服务器 2.0 版", "云服务器2.0版"),
+    ("+ 加速", "加速"),
+])
+def test_normalize_keyword(keyword, expected):
+    assert normalize_keyword(keyword) == expected
+
+
+def library(keywords, volumes):
+    return pd.DataFrame({
+        "关键词": keywords,
+        "搜索量": volumes,
+        "点击量": [100] * len(keywords),
+        "转化率": [0.05] * len(keywords),
+        "排名": list(range(1, len(keywords) + 1)),
+        "CPC": [2.0] * len(keywords),
+        "更新时间": "2024-03-01 09:00:00"
+    })
+
+
+def test_clusters_and_merge():
+    df = library(
+        ["阿里云服务器价格", "阿里云 服务器 价格", "阿里云服务器价格表", "c++教程", "c#教程", "对象存储"],
+        [100, 300, 50, 80, 90, 70]
+    )
+    index = KeywordIndex()
+    index.add_many(range(len(df)), df["关键词"])
+    assert index.clusters() == [[0, 1, 2]]
+    assert index.exact_items("阿里云服务器价格") == [0, 1]
+
+    merged = merge_keywords(df, index.clusters(), "2024-03-02 09:00:00")
+    assert merged.index.tolist() == [1, 3, 4, 5]
+    assert merged.at[1, "关键词"] == "阿里云 服务器 价格"
+    assert merged.at[1, "搜索量"] == 450
+    assert merged.at[1, "点击量"] == 300
+    assert merged.at[1, "排名"] == 1
+
+
+def test_cache_appends_in_place_and_keeps_old_views():
+    cache = KeywordIndexCache()
+    v1 = library(["阿里云服务器价格", "对象存储"], [100, 200])
+    v2 = pd.concat([v1, library(["阿里云服务器 价格表", "云数据库"], [10, 20])], ignore_index=True)
+    old = cache.get("v1", v1)
+    new = cache.get("v2", v2)
+    assert new.index is old.index
+    assert new.clusters() == [[0, 2]]
+    assert old.clusters() == []
+    assert old.query("阿里云服务器价格表") == [(0, pytest.approx(7 / 8))]
+
+    # 合并删除了行：重建索引，旧版本的视图不受影响
+    rebuilt = cache.get("v3", v2.drop(index=[2]).reset_index(drop=True))
+    assert rebuilt.index is not old.index
+    assert rebuilt.exact_items("云数据库") == [2]
+    assert old.exact_items("云数据库") == []
+
+
+# 模板化关键词（共同前缀/后缀）会落入相同的桶，桶的大小有上限，插入代价不随词库增长而增长
+def test_build_scales_linearly_on_templated_keywords():
+    def build(n):
+        index = KeywordIndex()
+        started = time.perf_counter()
+        index.add_many(range(n), [f"关键词{i}号产品" for i in range(n)])
+        return index, (time.perf_counter() - started) / n
+
+    _, small = build(4000)
+    index, large = build(16000)
+    assert max(len(items) for bucket in index.buckets for items in bucket.values()) <= MAX_BUCKET_SIZE
+    assert large < small * 3
@@ -0,0 +1,126 @@
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from library_history import KEY_COLUMN, LibraryHistory, simulate_library_drift
+
+
+# 与应用中的模拟数据相同：每个关键词重复出现 4 次
+def mock_library(size=20, seed=0):
+    rng = np.random.default_rng(seed)
+    keywords = ["阿里云", "云服务器", "云数据库", "对象存储", "负载均衡"] * (size // 5 + 1)
+    return pd.DataFrame({
+        "关键词": keywords[:size],
+        "搜索量": rng.integers(1000, 10000, size),
+        "点击量": rng.integers(100, 1000, size),
+        "转化率": rng.uniform(0.01, 0.1, size),
+        "排名": rng.integers(1, 50, size),
+        "CPC": rng.uniform(1, 10, size),
+        "状态": rng.choice(["启用", "暂停", "删除"], size),
+        "优先级": rng.choice(["高", "中", "低"], size),
+        "更新时间": "2024-03-01 09:00:00"
+    })
+
+
+def test_record_assigns_stable_ids(tmp_path):
+    history = LibraryHistory(root=str(tmp_path))
+    recorded = history.record(mock_library(), date(2024, 3, 1))
+    assert recorded[KEY_COLUMN].tolist() == list(range(1, 21))
+
+    # 已有 ID 保持不变，新增行从未用过的 ID 继续分配（删除的 ID 不复用）
+    library = pd.concat([recorded.iloc[:-1], mock_library(2, seed=1)], ignore_index=True)
+    recorded = history.record(library, date(2024, 3, 2))
+    assert recorded[KEY_COLUMN].tolist() == list(range(1, 20)) + [21, 22]
+
+
+def test_removing_duplicate_keyword_round_trip(tmp_path):
+    history = LibraryHistory(root=str(tmp_path))
+    day1, day2 = date(2024, 3, 1), date(2024, 3, 2)
+    before = history.record(mock_library(), day1)
+
+    # 删除“阿里云”的第一个副本，修改后面一个副本的排名
+    after = before.drop(index=0).reset_index(drop=True)
+    later_copy = after.index[after["关键词"] == "阿里云"][1]
+    after.loc[later_copy, "排名"] = 99
+    after = history.record(after, day2)
+
+    pd.testing.assert_frame_equal(history.reconstruct(day1), before)
+    pd.testing.assert_frame_equal(history.reconstruct(day2), after)
+
+    changes = history.diff(day1, day2)
+    pd.testing.assert_frame_equal(changes["删除"], before.iloc[[0]].drop(columns=KEY_COLUMN).reset_index(drop=True))
+    assert changes["新增"].empty
+    assert changes["状态变化"].empty
+    assert changes["排名变化"][["原排名", "现排名"]].values.tolist() == [[before.at[later_copy + 1, "排名"], 99]]
+
+
+def test_round_trip_over_checkpoints(tmp_path):
+    history = LibraryHistory(root=str(tmp_path), checkpoint_interval=7)
+    library, truth = mock_library(), {}
+    start = date(2024, 3, 1)
+    for offset in range(40):
+        day = start + timedelta(days=offset)
+        if offset:
+            library = simulate_library_drift(library, day)
+        library = history.record(library, day)
+        truth[day] = library
+
+    # 新实例不带缓存，从磁盘重建每一天
+    history = LibraryHistory(root=str(tmp_path))
+    for day, expected in truth.items():
+        pd.testing.assert_frame_equal(history.reconstruct(day), expected)
+
+    old, new = truth[start + timedelta(days=10)], truth[start + timedelta(days=39)]
+    changes = history.diff(start + timedelta(days=10), start + timedelta(days=39))
+    removed = old[~old[KEY_COLUMN].isin(new[KEY_COLUMN])]
+    added = new[~new[KEY_COLUMN].isin(old[KEY_COLUMN])]
+    assert changes["删除"]["关键词"].tolist() == removed["关键词"].tolist()
+    assert changes["新增"]["关键词"].tolist() == added["关键词"].tolist()
+    common = old.merge(new, on=KEY_COLUMN, suffixes=("_旧", "_新"))
+    assert len(changes["排名变化"]) == (common["排名_旧"] != common["排名_新"]).sum()
+    assert len(changes["状态变化"]) == (common["状态_旧"] != common["状态_新"]).sum()
+
+
+def test_apply_keeps_concurrent_changes(tmp_path):
+    history = LibraryHistory(root=str(tmp_path))
+    history.record(mock_library(), date(2024, 3, 1))
+    day = date(2024, 3, 2)
+
+    # 两个会话读取同一个版本后各自修改，后写入的一方不会覆盖先写入的修改
+    _, session_a = history.latest()
+    _, session_b = history.latest()
+    history.apply(added=mock_library(1, seed=1).assign(关键词="云监控"), day=day)
+    removed_id = session_a.at[0, KEY_COLUMN]
+    history.apply(removed=[removed_id], day=day)
+    updated = session_b.iloc[[0, 1]].assign(排名=99)
+    version, library = history.apply(updated=updated, day=day)
+
+    assert "云监控" in library["关键词"].tolist()
+    assert removed_id not in library[KEY_COLUMN].tolist()
+    assert library.loc[library[KEY_COLUMN] == session_b.at[1, KEY_COLUMN], "排名"].tolist() == [99]
+    assert len(library) == 20
+    assert history.latest()[0] == version
+    pd.testing.assert_frame_equal(history.reconstruct(day), library)
+
+
+# 读取不加锁：按旧清单读取的会话在当天版本被重写后仍能读到旧版本，文件在保留时间过后才删除
+def test_replaced_versions_outlive_concurrent_readers(tmp_path, monkeypatch):
+    writer = LibraryHistory(root=str(tmp_path))
+    writer.record(mock_library(), date(2024, 3, 1))
+    day = date(2024, 3, 2)
+    writer.apply(added=mock_library(1, seed=1).assign(关键词="云监控"), day=day)
+
+    reader = LibraryHistory(root=str(tmp_path))
+    old_versions = reader._read_manifest()["versions"]
+    writer.apply(added=mock_library(1, seed=2).assign(关键词="云解析"), day=day)
+    writer.apply(removed=[1], day=day)
+    old = reader._frame(old_versions, day.isoformat())
+    assert old["关键词"].tolist()[-1] == "云监控"
+
+    monkeypatch.setattr("library_history.GARBAGE_GRACE_SECONDS", 0)
+    writer.apply(removed=[2], day=day)
+    manifest = writer._read_manifest()
+    assert manifest["garbage"] == []
+    assert not os.path.exists(os.path.join(str(tmp_path), old_versions[day.isoformat()]["path"]))
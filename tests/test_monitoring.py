@@ -0,0 +1,77 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from monitoring import MonitoringService, StreamingDetector, simulate_hourly_metrics, tracked_keywords
+
+
+# 回放 30 天模拟数据，返回预热结束后每个整点注入的异常位置与检测出的告警
+def replay(days=30):
+    keywords = tracked_keywords()
+    detector = StreamingDetector(keywords)
+    start = datetime(2024, 3, 1)
+    injected, detected = {}, {}
+    for i in range(days * 24):
+        hour = start + timedelta(hours=i)
+        values, anomalies = simulate_hourly_metrics(hour, len(keywords), with_anomalies=True)
+        ready = detector.count >= detector.min_periods
+        eligible = ready & (detector.mean["转化量"] >= detector.min_conversion_baseline)
+        alerts = detector.update(hour, values)
+        key = hour.strftime("%Y-%m-%d %H:%M")
+        for kind, mask in anomalies.items():
+            mask = (eligible if kind == "转化骤降" else ready) & mask
+            injected.setdefault(kind, set()).update((key, k) for k in np.asarray(keywords)[mask])
+        for kind, group in alerts.groupby("类型"):
+            detected.setdefault(kind, set()).update((key, k) for k in group["关键词"])
+    return injected, detected
+
+
+def test_injected_anomalies_are_detected():
+    injected, detected = replay()
+    for kind in ["转化骤降", "排名下跌"]:
+        assert len(injected[kind]) > 100
+        missed = injected[kind] - detected.get(kind, set())
+        assert len(missed) <= 0.02 * len(injected[kind]), f"{kind} 漏报 {len(missed)}/{len(injected[kind])}"
+
+
+def test_conversion_collapse_has_no_false_alerts():
+    injected, detected = replay()
+    assert detected["转化骤降"] <= injected["转化骤降"]
+
+
+def test_low_baseline_conversions_are_ignored():
+    detector = StreamingDetector(["低量词", "正常词"])
+    hour = datetime(2024, 3, 1)
+    for i in range(detector.min_periods):
+        detector.update(hour + timedelta(hours=i), {
+            "排名": np.array([5, 5]),
+            "流量": np.array([100, 100]),
+            "转化量": np.array([0.5, 10.0])
+        })
+    alerts = detector.update(hour + timedelta(hours=detector.min_periods), {
+        "排名": np.array([5, 5]),
+        "流量": np.array([100, 100]),
+        "转化量": np.array([0.0, 1.0])
+    })
+    assert alerts["关键词"].tolist() == ["正常词"]
+    assert alerts["类型"].tolist() == ["转化骤降"]
+
+
+# 检测失败时后台线程继续运行，下次轮询重试
+def test_service_loop_survives_failures(tmp_path):
+    ticks = []
+
+    class FlakyService(MonitoringService):
+        def tick(self, now=None):
+            ticks.append(now)
+            if len(ticks) == 1:
+                raise OSError("告警文件写入失败")
+
+    service = FlakyService(keywords=tracked_keywords()[:5], state_path=str(tmp_path / "state.npz"),
+                           summary_path=str(tmp_path / "summary.jsonl"), poll_interval=0.01).start()
+    deadline = time.time() + 5
+    while len(ticks) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    service.stop()
+    assert len(ticks) >= 2
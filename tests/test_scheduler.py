@@ -0,0 +1,76 @@
+import time
+from datetime import date, datetime
+
+import pytest
+
+from reports import previous_period, report_period
+from scheduler import CronSchedule, ReportScheduler, SnapshotStore
+
+
+# 补算和调度失败时后台线程继续运行，失败的调度在下次轮询时重试
+def test_loop_survives_failures(tmp_path):
+    scheduled_at = datetime(2024, 3, 4, 2, 0)
+    calls = []
+
+    class FlakyScheduler(ReportScheduler):
+        def materialize(self, report_type, today=None, scheduled_at=None):
+            calls.append(scheduled_at)
+            if len(calls) in (1, 3):
+                raise OSError("磁盘写入失败")
+            return 1
+
+        def ensure_current(self, today=None):
+            self.materialize("周报", today)
+
+        def run_pending(self, now=None):
+            super().run_pending(now or scheduled_at)
+
+    scheduler = FlakyScheduler(store=SnapshotStore(str(tmp_path)), schedules={"周报": "0 2 * * 1"}, poll_interval=0.01)
+    scheduler.start()
+    deadline = time.time() + 5
+    while len(calls) < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    scheduler.stop()
+    assert calls == [None, None, scheduled_at, scheduled_at]
+    assert scheduler._pending == {}
+
+
+@pytest.mark.parametrize("expr, dt, expected", [
+    ("0 2 * * 1", datetime(2024, 3, 4, 2, 0), True),    # 周一
+    ("0 2 * * 1", datetime(2024, 3, 5, 2, 0), False),
+    ("0 2 * * 1", datetime(2024, 3, 4, 2, 1), False),
+    ("0 3 1 * *", datetime(2024, 4, 1, 3, 0), True),
+    ("0 3 1 * *", datetime(2024, 4, 2, 3, 0), False),
+    ("*/15 9-18 * * *", datetime(2024, 3, 4, 18, 45), True),
+    ("*/15 9-18 * * *", datetime(2024, 3, 4, 19, 0), False),
+    ("0 0 * * 0", datetime(2024, 3, 10, 0, 0), True),    # 周日：0 和 7 等价
+    ("0 0 * * 7", datetime(2024, 3, 10, 0, 0), True),
+    ("0 0 1,15 * *", datetime(2024, 3, 15, 0, 0), True),
+    # 日和周同时限定时满足其一即可：每月 1 日，或每个周一
+    ("0 2 1 * 1", datetime(2024, 3, 1, 2, 0), True),     # 周五、1 日
+    ("0 2 1 * 1", datetime(2024, 3, 4, 2, 0), True),     # 周一
+    ("0 2 1 * 1", datetime(2024, 3, 5, 2, 0), False),
+    # 只限定其中一个时另一个不起作用
+    ("0 2 */2 * *", datetime(2024, 3, 3, 2, 0), True),
+    ("0 2 */2 * 1", datetime(2024, 3, 3, 2, 0), False),  # 3 日是周日
+    ("0 2 */2 * 1", datetime(2024, 3, 5, 2, 0), False),  # 5 日是周二
+])
+def test_cron_matches(expr, dt, expected):
+    assert CronSchedule(expr).matches(dt) is expected
+
+
+@pytest.mark.parametrize("expr", ["0 2 * *", "60 * * * *", "0 24 * * *", "0 0 0 * *", "*/0 * * * *"])
+def test_cron_rejects_invalid(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr)
+
+
+def test_monthly_report_compares_previous_calendar_month():
+    start, end = report_period("月报", date(2024, 3, 15))
+    assert (start, end) == (date(2024, 2, 1), date(2024, 2, 29))
+    assert previous_period(start, end) == (date(2024, 1, 1), date(2024, 1, 31))
+    assert previous_period(date(2024, 3, 1), date(2024, 3, 31)) == (date(2024, 2, 1), date(2024, 2, 29))
+    # 周报及其他时间段仍对比同长度的前一段
+    assert previous_period(date(2024, 3, 4), date(2024, 3, 10)) == (date(2024, 2, 26), date(2024, 3, 3))
+    assert previous_period(date(2024, 3, 1), date(2024, 3, 30)) == (date(2024, 1, 31), date(2024, 2, 29))
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from tags import DEFAULT_TAG_RULES, TagIndex, TagIndexCache, TagStore, evaluate_rule
+
+
+def library(keywords, first_id=1):
+    return pd.DataFrame({"ID": np.arange(first_id, first_id + len(keywords)), "关键词": keywords})
+
+
+def assert_same_tags(index, expected):
+    assert index.tags() == expected.tags()
+    positions = np.arange(expected.size)
+    assert index.tags_of(positions) == expected.tags_of(positions)
+
+
+def test_regex_rules_ignore_case():
+    rule = {"标签": "产品线:ECS", "类型": "正则", "规则": "ECS|Rds"}
+    assert evaluate_rule(rule, pd.Series(["阿里云ecs", "RDS 价格", "oss"])).tolist() == [True, True, False]
+
+
+def test_store_round_trip_and_cached_indexes(tmp_path):
+    store = TagStore(root=str(tmp_path))
+    cache = TagIndexCache()
+    v1 = library(["阿里云ecs", "云数据库价格", "对象存储"])
+    store.set_manual("活动:双11", [1, 3])
+    version, rules, manual = store.load()
+    assert {tag: ids.tolist() for tag, ids in manual.items()} == {"活动:双11": [1, 3]}
+    assert rules == DEFAULT_TAG_RULES
+    cache.get("v1", v1, version, rules, manual)
+
+    # 追加关键词 + 修改规则：增量得到的索引与重新构建的一致
+    v2 = pd.concat([v1, library(["ecs 教程", "cdn 加速"], first_id=4)], ignore_index=True)
+    rules = rules[1:] + [{"标签": "教程", "类型": "词典", "规则": "教程"}]
+    assert store.update_rules(rules) == ["产品线:ECS", "教程"]
+    store.set_manual("活动:双11", [3], value=False)
+    version, rules, manual = TagStore(root=str(tmp_path)).load()
+    derived = cache.get("v2", v2, version, rules, manual)
+
+    expected = TagIndex(rules).build(v2["关键词"])
+    expected.set_manual("活动:双11", [0])
+    assert_same_tags(derived, expected)
+    assert cache.get("v2", v2, version, rules, manual) is derived